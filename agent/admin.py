@@ -1,25 +1,174 @@
 # agent/admin.py
 
 from django.contrib import admin
+from django.forms.models import BaseInlineFormSet
+from django.contrib.postgres.search import SearchQuery
+from django.db import connection
+from django.db.models import Count, Func, IntegerField, Q
+from django.db.models import TextField
+from django.db.models.functions import Cast, Substr
 from django.utils.html import format_html
+from django.utils.safestring import mark_safe
 from django.urls import reverse
 from django.template.defaultfilters import truncatechars
-import json
+from functools import lru_cache
+import html
+
+import orjson
+
 from .models import (
     Customer, Interaction, FollowUp, 
     Template, Campaign, CampaignTarget,
-    ConversationState
+    ConversationState, pretty_json
 )
 
+
+class JSONArrayLength(Func):
+    """Length of a JSON array column, computed by the database"""
+    function = 'JSON_ARRAY_LENGTH'
+    output_field = IntegerField()
+    
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function='JSONB_ARRAY_LENGTH', **extra_context)
+    
+    def as_mysql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function='JSON_LENGTH', **extra_context)
+
+
+_PK_PLACEHOLDER = '__pk__'
+
+
+@lru_cache(maxsize=None)
+def _change_url_template(view_name):
+    """Reverse an admin change URL once, leaving a placeholder for the object id"""
+    return reverse(view_name, args=[_PK_PLACEHOLDER])
+
+
+def admin_change_url(view_name, object_id):
+    """Admin change URL for object_id without a URL resolver walk per call"""
+    return _change_url_template(view_name).replace(_PK_PLACEHOLDER, str(object_id))
+
+
+def pre_block(text):
+    """Render preformatted text, escaped once with the C-accelerated html.escape"""
+    return mark_safe(f'<pre>{html.escape(text, quote=False)}</pre>')
+
+
+class ChangelistDeferMixin:
+    """Skip loading columns that the changelist never renders"""
+    changelist_defer = ()
+    
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        match = request.resolver_match
+        if self.changelist_defer and match and match.url_name.endswith('_changelist'):
+            queryset = queryset.defer(*self.changelist_defer)
+        return queryset
+
+
+class RawJSONChangeFormMixin:
+    """
+    Load displayed JSON columns as raw text on the change form.
+    
+    The columns are only shown pretty-printed, so decoding them into Python
+    through the model field and re-encoding them is skipped in favour of a
+    single orjson pass over the database text.
+    """
+    raw_json_fields = ()
+    
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        match = request.resolver_match
+        if self.raw_json_fields and match and match.url_name.endswith('_change'):
+            queryset = queryset.defer(*self.raw_json_fields).annotate(**{
+                f'_{name}_raw': Cast(name, TextField()) for name in self.raw_json_fields
+            })
+        return queryset
+    
+    def json_pretty(self, obj, field_name):
+        raw = getattr(obj, f'_{field_name}_raw', None)
+        if raw is None:
+            return getattr(obj, f'{field_name}_pretty')
+        return pretty_json(orjson.loads(raw))
+
+
+class BoundedInlineFormSet(BaseInlineFormSet):
+    """Inline formset that only loads the rows it can display"""
+    row_limit = None
+    
+    def get_queryset(self):
+        if not hasattr(self, '_bounded_queryset'):
+            queryset = super().get_queryset()
+            if self.row_limit is not None:
+                queryset = queryset[:self.row_limit]
+            self._bounded_queryset = queryset
+        return self._bounded_queryset
+
+
+class BoundedInlineMixin:
+    """
+    Cap an inline at its newest row_limit rows.
+    
+    max_num cannot do this: it only limits extra forms, and the admin
+    zeroes it for inlines without add permission.
+    """
+    formset = BoundedInlineFormSet
+    row_limit = None
+    
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.row_limit = self.row_limit
+        return formset
+
+
+class InteractionInline(BoundedInlineMixin, admin.TabularInline):
+    model = Interaction
+    extra = 0
+    fields = ('timestamp', 'direction', 'message_type', 'content_short', 'language')
+    readonly_fields = ('timestamp', 'direction', 'message_type', 'content_short', 'language')
+    ordering = ('-timestamp',)
+    row_limit = 10
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('customer')
+    
+    def content_short(self, obj):
+        return truncatechars(obj.content, 100)
+    content_short.short_description = 'Content'
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+class FollowUpInline(BoundedInlineMixin, admin.TabularInline):
+    model = FollowUp
+    extra = 0
+    fields = ('scheduled_date', 'status', 'follow_up_type', 'follow_up_reason')
+    readonly_fields = ('scheduled_date', 'status', 'follow_up_type', 'follow_up_reason')
+    ordering = ('-scheduled_date',)
+    row_limit = 5
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('customer')
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Customer)
-class CustomerAdmin(admin.ModelAdmin):
+class CustomerAdmin(RawJSONChangeFormMixin, ChangelistDeferMixin, admin.ModelAdmin):
     list_display = ('name_display', 'phone_number', 'preferred_language', 
                    'conversation_state', 'interest_level', 'last_contacted_display', 
                    'next_contact_date_display', 'do_not_contact')
     list_filter = ('preferred_language', 'conversation_state', 'do_not_contact', 'created_at')
-    search_fields = ('name', 'phone_number')
-    readonly_fields = ('created_at', 'updated_at')
+    search_fields = ('name', 'phone_number__startswith')
+    readonly_fields = ('created_at', 'updated_at', 'property_details_formatted',
+                       'loan_requirements_formatted', 'consents_formatted')
     date_hierarchy = 'created_at'
+    changelist_defer = ('property_details', 'loan_requirements', 'consents')
+    inlines = [InteractionInline, FollowUpInline]
+    
+    raw_json_fields = ('property_details', 'loan_requirements', 'consents')
     
     fieldsets = (
         ('Basic Information', {
@@ -63,60 +212,39 @@ class CustomerAdmin(admin.ModelAdmin):
     next_contact_date_display.short_description = 'Next Contact'
     
     def property_details_formatted(self, obj):
-        if not obj.property_details:
+        pretty = self.json_pretty(obj, 'property_details')
+        if not pretty:
             return 'No property details available'
-        return format_html('<pre>{}</pre>', json.dumps(obj.property_details, indent=4))
+        return pre_block(pretty)
     property_details_formatted.short_description = 'Property Details'
     
     def loan_requirements_formatted(self, obj):
-        if not obj.loan_requirements:
+        pretty = self.json_pretty(obj, 'loan_requirements')
+        if not pretty:
             return 'No loan requirements available'
-        return format_html('<pre>{}</pre>', json.dumps(obj.loan_requirements, indent=4))
+        return pre_block(pretty)
     loan_requirements_formatted.short_description = 'Loan Requirements'
     
     def consents_formatted(self, obj):
-        if not obj.consents:
+        pretty = self.json_pretty(obj, 'consents')
+        if not pretty:
             return 'No consent information available'
-        return format_html('<pre>{}</pre>', json.dumps(obj.consents, indent=4))
+        return pre_block(pretty)
     consents_formatted.short_description = 'Consent Information'
 
 
-class InteractionInline(admin.TabularInline):
-    model = Interaction
-    extra = 0
-    fields = ('timestamp', 'direction', 'message_type', 'content_short', 'language')
-    readonly_fields = ('timestamp', 'direction', 'message_type', 'content_short', 'language')
-    ordering = ('-timestamp',)
-    max_num = 10
-    
-    def content_short(self, obj):
-        return truncatechars(obj.content, 100)
-    content_short.short_description = 'Content'
-    
-    def has_add_permission(self, request, obj=None):
-        return False
-
-
-class FollowUpInline(admin.TabularInline):
-    model = FollowUp
-    extra = 0
-    fields = ('scheduled_date', 'status', 'follow_up_type', 'follow_up_reason')
-    readonly_fields = ('scheduled_date', 'status', 'follow_up_type', 'follow_up_reason')
-    ordering = ('-scheduled_date',)
-    max_num = 5
-    
-    def has_add_permission(self, request, obj=None):
-        return False
-
-
 @admin.register(Interaction)
-class InteractionAdmin(admin.ModelAdmin):
+class InteractionAdmin(RawJSONChangeFormMixin, ChangelistDeferMixin, admin.ModelAdmin):
     list_display = ('customer_link', 'timestamp', 'direction', 'message_type', 
                     'content_short', 'detected_intent', 'conversation_state', 'language')
     list_filter = ('direction', 'message_type', 'detected_intent', 'conversation_state', 'language')
-    search_fields = ('content', 'customer__name', 'customer__phone_number')
+    search_fields = ('content', 'customer__name', 'customer__phone_number__startswith')
+    list_select_related = ('customer',)
     readonly_fields = ('timestamp', 'ai_analysis_formatted')
     date_hierarchy = 'timestamp'
+    changelist_defer = ('content', 'ai_analysis', 'search_vector')
+    
+    raw_json_fields = ('ai_analysis',)
     
     fieldsets = (
         ('Message Details', {
@@ -135,27 +263,49 @@ class InteractionAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        # One character past the display length tells truncatechars whether to add an ellipsis
+        return super().get_queryset(request).annotate(_content_prefix=Substr('content', 1, 51))
+    
+    def get_search_fields(self, request):
+        # On PostgreSQL content is matched through the full-text search_vector
+        if connection.vendor == 'postgresql':
+            return tuple(field for field in self.search_fields if field != 'content')
+        return self.search_fields
+    
+    def get_search_results(self, request, queryset, search_term):
+        unfiltered = queryset
+        queryset, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        
+        if search_term and connection.vendor == 'postgresql':
+            queryset |= unfiltered.filter(search_vector=SearchQuery(search_term))
+        
+        return queryset, may_have_duplicates
+    
     def customer_link(self, obj):
-        url = reverse('admin:agent_customer_change', args=[obj.customer.id])
-        return format_html('<a href="{}">{}</a>', url, obj.customer)
+        url = admin_change_url('admin:agent_customer_change', obj.customer_id)
+        return format_html('<a href="{}">{}</a>', url, obj.customer.name or obj.customer.phone_number)
     customer_link.short_description = 'Customer'
     
     def content_short(self, obj):
-        return truncatechars(obj.content, 50)
+        return truncatechars(obj._content_prefix or '', 50)
     content_short.short_description = 'Content'
     
     def ai_analysis_formatted(self, obj):
-        if not obj.ai_analysis:
+        pretty = self.json_pretty(obj, 'ai_analysis')
+        if not pretty:
             return 'No AI analysis available'
-        return format_html('<pre>{}</pre>', json.dumps(obj.ai_analysis, indent=4))
+        return pre_block(pretty)
     ai_analysis_formatted.short_description = 'AI Analysis'
 
 
 @admin.register(FollowUp)
-class FollowUpAdmin(admin.ModelAdmin):
+class FollowUpAdmin(ChangelistDeferMixin, admin.ModelAdmin):
     list_display = ('customer_link', 'scheduled_date', 'status', 'follow_up_type', 'follow_up_reason_short')
     list_filter = ('status', 'follow_up_type', 'scheduled_date')
-    search_fields = ('customer__name', 'customer__phone_number', 'follow_up_reason', 'custom_message')
+    search_fields = ('customer__name', 'customer__phone_number__startswith', 'follow_up_reason', 'custom_message')
+    list_select_related = ('customer',)
+    changelist_defer = ('follow_up_reason', 'custom_message', 'result_notes')
     readonly_fields = ('created_at', 'updated_at')
     date_hierarchy = 'scheduled_date'
     
@@ -177,21 +327,26 @@ class FollowUpAdmin(admin.ModelAdmin):
     )
     
     def customer_link(self, obj):
-        url = reverse('admin:agent_customer_change', args=[obj.customer.id])
-        return format_html('<a href="{}">{}</a>', url, obj.customer)
+        url = admin_change_url('admin:agent_customer_change', obj.customer_id)
+        return format_html('<a href="{}">{}</a>', url, obj.customer.name or obj.customer.phone_number)
     customer_link.short_description = 'Customer'
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(_reason_prefix=Substr('follow_up_reason', 1, 51))
+    
     def follow_up_reason_short(self, obj):
-        return truncatechars(obj.follow_up_reason or '', 50)
+        return truncatechars(obj._reason_prefix or '', 50)
     follow_up_reason_short.short_description = 'Reason'
 
 
 @admin.register(Template)
-class TemplateAdmin(admin.ModelAdmin):
+class TemplateAdmin(RawJSONChangeFormMixin, admin.ModelAdmin):
     list_display = ('name', 'language_code', 'category', 'is_approved', 'approval_date')
     list_filter = ('language_code', 'category', 'is_approved')
     search_fields = ('name', 'content', 'header_text', 'footer_text')
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('created_at', 'updated_at', 'sample_values_formatted')
+    
+    raw_json_fields = ('sample_values',)
     
     fieldsets = (
         ('Template Details', {
@@ -211,20 +366,26 @@ class TemplateAdmin(admin.ModelAdmin):
     )
     
     def sample_values_formatted(self, obj):
-        if not obj.sample_values:
+        pretty = self.json_pretty(obj, 'sample_values')
+        if not pretty:
             return 'No sample values available'
-        return format_html('<pre>{}</pre>', json.dumps(obj.sample_values, indent=4))
+        return pre_block(pretty)
     sample_values_formatted.short_description = 'Sample Values'
 
 
 @admin.register(Campaign)
-class CampaignAdmin(admin.ModelAdmin):
+class CampaignAdmin(RawJSONChangeFormMixin, ChangelistDeferMixin, admin.ModelAdmin):
     list_display = ('name', 'template', 'status', 'start_date', 'end_date', 
-                   'total_targets', 'total_sent', 'total_responses')
+                   'targets_count', 'sent_count', 'responses_count')
     list_filter = ('status', 'start_date', 'template')
     search_fields = ('name', 'description')
+    list_select_related = ('template',)
+    changelist_defer = ('target_criteria',)
     readonly_fields = ('created_at', 'updated_at', 'created_by', 
-                      'total_targets', 'total_sent', 'total_responses')
+                      'targets_count', 'sent_count', 'responses_count',
+                      'target_criteria_formatted')
+    
+    raw_json_fields = ('target_criteria',)
     
     fieldsets = (
         ('Campaign Details', {
@@ -238,7 +399,7 @@ class CampaignAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
         ('Results', {
-            'fields': ('total_targets', 'total_sent', 'total_responses')
+            'fields': ('targets_count', 'sent_count', 'responses_count')
         }),
         ('Tracking', {
             'fields': ('created_by', 'created_at', 'updated_at'),
@@ -246,10 +407,34 @@ class CampaignAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        # Results are counted from the targets themselves rather than the stored totals
+        return super().get_queryset(request).annotate(
+            _targets_count=Count('targets'),
+            _sent_count=Count('targets', filter=Q(targets__status__in=['sent', 'responded'])),
+            _responses_count=Count('targets', filter=Q(targets__status='responded')),
+        )
+    
+    def targets_count(self, obj):
+        return getattr(obj, '_targets_count', 0)
+    targets_count.short_description = 'Total Targets'
+    targets_count.admin_order_field = '_targets_count'
+    
+    def sent_count(self, obj):
+        return getattr(obj, '_sent_count', 0)
+    sent_count.short_description = 'Total Sent'
+    sent_count.admin_order_field = '_sent_count'
+    
+    def responses_count(self, obj):
+        return getattr(obj, '_responses_count', 0)
+    responses_count.short_description = 'Total Responses'
+    responses_count.admin_order_field = '_responses_count'
+    
     def target_criteria_formatted(self, obj):
-        if not obj.target_criteria:
+        pretty = self.json_pretty(obj, 'target_criteria')
+        if not pretty:
             return 'No target criteria defined'
-        return format_html('<pre>{}</pre>', json.dumps(obj.target_criteria, indent=4))
+        return pre_block(pretty)
     target_criteria_formatted.short_description = 'Target Criteria'
     
     def save_model(self, request, obj, form, change):
@@ -263,26 +448,30 @@ class CampaignTargetAdmin(admin.ModelAdmin):
     list_display = ('customer_link', 'campaign_link', 'status', 
                    'scheduled_time', 'sent_time', 'response_time')
     list_filter = ('status', 'scheduled_time', 'sent_time', 'campaign')
-    search_fields = ('customer__name', 'customer__phone_number', 'campaign__name', 'error_message')
+    search_fields = ('customer__name', 'customer__phone_number__startswith', 'campaign__name', 'error_message')
+    list_select_related = ('customer', 'campaign')
     readonly_fields = ('scheduled_time', 'sent_time', 'response_time', 
                       'message_id', 'delivery_status', 'error_message')
     
     def customer_link(self, obj):
-        url = reverse('admin:agent_customer_change', args=[obj.customer.id])
-        return format_html('<a href="{}">{}</a>', url, obj.customer)
+        url = admin_change_url('admin:agent_customer_change', obj.customer_id)
+        return format_html('<a href="{}">{}</a>', url, obj.customer.name or obj.customer.phone_number)
     customer_link.short_description = 'Customer'
     
     def campaign_link(self, obj):
-        url = reverse('admin:agent_campaign_change', args=[obj.campaign.id])
+        url = admin_change_url('admin:agent_campaign_change', obj.campaign_id)
         return format_html('<a href="{}">{}</a>', url, obj.campaign.name)
     campaign_link.short_description = 'Campaign'
 
 
 @admin.register(ConversationState)
-class ConversationStateAdmin(admin.ModelAdmin):
+class ConversationStateAdmin(RawJSONChangeFormMixin, ChangelistDeferMixin, admin.ModelAdmin):
     list_display = ('name', 'description_short', 'transitions_count')
     search_fields = ('name', 'description')
-    readonly_fields = ('created_at', 'updated_at')
+    changelist_defer = ('description', 'possible_transitions', 'prompts')
+    readonly_fields = ('created_at', 'updated_at', 'possible_transitions_formatted', 'prompts_formatted')
+    
+    raw_json_fields = ('possible_transitions', 'prompts')
     
     fieldsets = (
         ('State Details', {
@@ -302,22 +491,31 @@ class ConversationStateAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            _description_prefix=Substr('description', 1, 101),
+            _transitions_count=JSONArrayLength('possible_transitions'),
+        )
+    
     def description_short(self, obj):
-        return truncatechars(obj.description or '', 100)
+        return truncatechars(obj._description_prefix or '', 100)
     description_short.short_description = 'Description'
     
     def transitions_count(self, obj):
-        return len(obj.possible_transitions) if obj.possible_transitions else 0
+        return obj._transitions_count or 0
     transitions_count.short_description = 'Transitions'
+    transitions_count.admin_order_field = '_transitions_count'
     
     def possible_transitions_formatted(self, obj):
-        if not obj.possible_transitions:
+        pretty = self.json_pretty(obj, 'possible_transitions')
+        if not pretty:
             return 'No transitions defined'
-        return format_html('<pre>{}</pre>', json.dumps(obj.possible_transitions, indent=4))
+        return pre_block(pretty)
     possible_transitions_formatted.short_description = 'Possible Transitions'
     
     def prompts_formatted(self, obj):
-        if not obj.prompts:
+        pretty = self.json_pretty(obj, 'prompts')
+        if not pretty:
             return 'No prompts defined'
-        return format_html('<pre>{}</pre>', json.dumps(obj.prompts, indent=4))
+        return pre_block(pretty)
     prompts_formatted.short_description = 'Prompts'
\ No newline at end of file
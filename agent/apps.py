@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AgentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'agent'
+
+    def ready(self):
+        from core.log_queue import start_log_listener
+        start_log_listener()
@@ -0,0 +1,24 @@
+# agent/management/commands/build_intent_centroids.py
+import json
+
+from django.core.management.base import BaseCommand
+
+from core.intent_classifier import build_intent_centroids
+
+
+class Command(BaseCommand):
+    help = 'Build the intent centroids used by the embedding intent classifier'
+
+    def add_arguments(self, parser):
+        parser.add_argument('examples', help='JSON file mapping each intent to a list of example messages')
+        parser.add_argument('output', help='.npz file to write, for INTENT_CENTROIDS_FILE')
+        parser.add_argument('--model', help='Embedding model (defaults to INTENT_EMBEDDING_MODEL)')
+
+    def handle(self, *args, **options):
+        with open(options['examples']) as f:
+            examples = json.load(f)
+        
+        self.stdout.write(f'Embedding examples for {len(examples)} intents...')
+        build_intent_centroids(examples, options['output'], options['model'])
+        
+        self.stdout.write(self.style.SUCCESS(f"Saved intent centroids to {options['output']}"))
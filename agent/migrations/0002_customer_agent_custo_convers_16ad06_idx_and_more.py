@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-14 18:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("agent", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="customer",
+            index=models.Index(
+                fields=["conversation_state", "interest_level"],
+                name="agent_custo_convers_16ad06_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="customer",
+            index=models.Index(
+                condition=models.Q(("do_not_contact", False)),
+                fields=["do_not_contact", "next_contact_date"],
+                name="cust_dnc_next_idx",
+            ),
+        ),
+    ]
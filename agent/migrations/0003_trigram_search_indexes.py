@@ -0,0 +1,44 @@
+# Trigram indexes backing the admin's icontains searches on PostgreSQL.
+#
+# Django compiles ``icontains`` on PostgreSQL to ``UPPER(col::text) LIKE
+# UPPER(%s)``, so the indexes are built over that expression with
+# ``gin_trgm_ops``. Other backends have no trigram support and are skipped.
+
+from django.db import migrations
+
+
+TRIGRAM_INDEXES = (
+    # (index name, table, column)
+    ("cust_name_trgm", "agent_customer", "name"),
+    ("int_content_trgm", "agent_interaction", "content"),
+)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON {table} "
+            f"USING gin ((UPPER({column}::text)) gin_trgm_ops)"
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    for name, _table, _column in TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("agent", "0002_customer_agent_custo_convers_16ad06_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.7 on 2026-10-14 18:58
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# On PostgreSQL the search vector is kept current by the built-in
+# tsvector_update_trigger and served by a GIN index. Content search then goes
+# through the vector, so the trigram index on content from 0003 is replaced.
+# Other backends keep the column unused and fall back to icontains.
+
+FORWARD_SQL = (
+    "DROP INDEX IF EXISTS int_content_trgm",
+    "UPDATE agent_interaction SET search_vector = to_tsvector('pg_catalog.english', content)",
+    "CREATE INDEX IF NOT EXISTS int_search_vector_gin ON agent_interaction USING gin (search_vector)",
+    "CREATE TRIGGER agent_interaction_search_vector_update "
+    "BEFORE INSERT OR UPDATE OF content ON agent_interaction FOR EACH ROW "
+    "EXECUTE FUNCTION tsvector_update_trigger(search_vector, 'pg_catalog.english', content)",
+)
+
+REVERSE_SQL = (
+    "DROP TRIGGER IF EXISTS agent_interaction_search_vector_update ON agent_interaction",
+    "DROP INDEX IF EXISTS int_search_vector_gin",
+    "CREATE INDEX IF NOT EXISTS int_content_trgm ON agent_interaction "
+    "USING gin ((UPPER(content::text)) gin_trgm_ops)",
+)
+
+
+def create_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    for statement in FORWARD_SQL:
+        schema_editor.execute(statement)
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    for statement in REVERSE_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("agent", "0003_trigram_search_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="interaction",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+    ]
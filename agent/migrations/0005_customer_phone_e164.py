@@ -0,0 +1,61 @@
+# Generated by Django 4.2.7 on 2026-10-14 19:02
+
+import re
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+NON_DIGITS = re.compile(r"[^0-9]")
+
+
+def populate_phone_e164(apps, schema_editor):
+    Customer = apps.get_model("agent", "Customer")
+    batch = []
+    # Raw numbers by normalized number; any with more than one would break the unique constraint
+    numbers = defaultdict(list)
+
+    for customer in Customer.objects.only("id", "phone_number").iterator(chunk_size=2000):
+        # Leading zeros go with int(), so "0091..." matches "+91..." like the model's normalize_phone_number
+        digits = NON_DIGITS.sub("", customer.phone_number or "")
+        customer.phone_e164 = int(digits) if digits else None
+        if customer.phone_e164 is not None:
+            numbers[customer.phone_e164].append(f"{customer.id}: {customer.phone_number!r}")
+        batch.append(customer)
+
+        if len(batch) >= 2000:
+            Customer.objects.bulk_update(batch, ["phone_e164"])
+            batch = []
+
+    if batch:
+        Customer.objects.bulk_update(batch, ["phone_e164"])
+
+    duplicates = {number: rows for number, rows in numbers.items() if len(rows) > 1}
+    if duplicates:
+        report = "\n".join(f"  {number}: {', '.join(rows)}" for number, rows in sorted(duplicates.items()))
+        raise RuntimeError(
+            "Cannot make phone_e164 unique: these customers (id: phone_number) are the same number "
+            "written differently. Merge or correct them, then run the migration again.\n" + report
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("agent", "0004_interaction_search_vector"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customer",
+            name="phone_e164",
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(populate_phone_e164, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="customer",
+            name="phone_e164",
+            field=models.BigIntegerField(
+                blank=True, editable=False, null=True, unique=True
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-14 19:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("agent", "0005_customer_phone_e164"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="campaigntarget",
+            index=models.Index(
+                fields=["campaign", "status"], name="agent_campa_campaig_7e7d55_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="followup",
+            index=models.Index(
+                fields=["status", "scheduled_date"],
+                name="agent_follo_status_9e8f9f_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="interaction",
+            index=models.Index(
+                fields=["direction", "timestamp"], name="agent_inter_directi_976031_idx"
+            ),
+        ),
+    ]
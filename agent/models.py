@@ -1,16 +1,94 @@
 # agent/models.py
 
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
 from django.utils import timezone
+from django.utils.functional import cached_property
 import json
+import re
 import uuid
 
+import orjson
+
+
+_NON_DIGITS = re.compile(r'[^0-9]')
+
+
+def normalize_phone_number(phone_number):
+    """
+    E.164 digits of a phone number as an integer, or None if it has no digits
+    
+    Leading zeros are dropped with the formatting, so a 00 international
+    prefix ("0091...") matches the same number written as "+91..." or "91...".
+    """
+    digits = _NON_DIGITS.sub('', phone_number or '')
+    return int(digits) if digits else None
+
+
+def pretty_json(value):
+    """Pretty-print a JSONField value for display, or '' if it is empty"""
+    if not value:
+        return ''
+    return orjson.dumps(value, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+
+
+class JSONSetKey(models.Func):
+    """
+    Set one top-level key of a JSON column in place, without rewriting it from Python
+    
+    A NULL column (or a JSON value that is not an object) is treated as an
+    empty object, since merging into NULL would make the result NULL and lose the key.
+    """
+    output_field = models.JSONField()
+    
+    def __init__(self, expression, key, value, **extra):
+        self.key = key
+        self.value_json = json.dumps(value)
+        super().__init__(expression, **extra)
+    
+    def _compile_column(self, compiler):
+        return compiler.compile(self.get_source_expressions()[0])
+    
+    def as_sql(self, compiler, connection, **extra_context):
+        # SQLite JSON paths cannot quote every key, so merge a one-key object instead
+        column_sql, column_params = self._compile_column(compiler)
+        return (
+            f"JSON_PATCH(COALESCE({column_sql}, '{{}}'), JSON_OBJECT(%s, JSON(%s)))",
+            (*column_params, self.key, self.value_json),
+        )
+    
+    def as_mysql(self, compiler, connection, **extra_context):
+        column_sql, column_params = self._compile_column(compiler)
+        return (
+            f"JSON_MERGE_PATCH(COALESCE({column_sql}, JSON_OBJECT()), JSON_OBJECT(%s, CAST(%s AS JSON)))",
+            (*column_params, self.key, self.value_json),
+        )
+    
+    def as_postgresql(self, compiler, connection, **extra_context):
+        # || on a JSON null or other non-object would build an array, so those start empty too
+        column_sql, column_params = self._compile_column(compiler)
+        return (
+            f"(CASE WHEN JSONB_TYPEOF({column_sql}) = 'object' THEN {column_sql} ELSE '{{}}'::jsonb END"
+            f" || JSONB_BUILD_OBJECT(%s::text, %s::jsonb))",
+            (*column_params, *column_params, self.key, self.value_json),
+        )
+
+
+def _clear_cached_properties(instance, *names):
+    """Drop memoized cached_property values so they are recomputed"""
+    for name in names:
+        instance.__dict__.pop(name, None)
+
+
 class Customer(models.Model):
     """Model to store customer information"""
     
     # Basic information
     phone_number = models.CharField(max_length=20, unique=True, db_index=True)
+    # Normalized digits of phone_number, used for exact lookups
+    phone_e164 = models.BigIntegerField(unique=True, null=True, blank=True, editable=False)
     name = models.CharField(max_length=255, blank=True, null=True)
     preferred_language = models.CharField(max_length=50, default='english')
     
@@ -39,44 +117,126 @@ class Customer(models.Model):
             models.Index(fields=['next_contact_date']),
             models.Index(fields=['conversation_state']),
             models.Index(fields=['interest_level']),
+            models.Index(fields=['conversation_state', 'interest_level']),
+            models.Index(
+                fields=['do_not_contact', 'next_contact_date'],
+                name='cust_dnc_next_idx',
+                condition=models.Q(do_not_contact=False),
+            ),
         ]
     
     def __str__(self):
         return f"{self.name or 'Unknown'} ({self.phone_number})"
     
+    def clean(self):
+        # phone_e164 is not editable, so forms do not check its uniqueness themselves
+        phone_e164 = normalize_phone_number(self.phone_number)
+        if phone_e164 is not None and Customer.objects.filter(phone_e164=phone_e164).exclude(pk=self.pk).exists():
+            raise ValidationError({'phone_number': 'A customer with this phone number already exists.'})
+    
+    def save(self, *args, **kwargs):
+        self.phone_e164 = normalize_phone_number(self.phone_number)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'phone_number' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'phone_e164'}
+        
+        super().save(*args, **kwargs)
+        _clear_cached_properties(
+            self,
+            'property_details_pretty', 'loan_requirements_pretty', 'consents_pretty',
+            'property_value', 'loan_amount', 'loan_purpose', 'ltv_ratio',
+        )
+    
+    @cached_property
+    def property_details_pretty(self):
+        """Pretty-printed property details"""
+        return pretty_json(self.property_details)
+    
+    @cached_property
+    def loan_requirements_pretty(self):
+        """Pretty-printed loan requirements"""
+        return pretty_json(self.loan_requirements)
+    
+    @cached_property
+    def consents_pretty(self):
+        """Pretty-printed consent records"""
+        return pretty_json(self.consents)
+    
+    @cached_property
+    def property_value(self):
+        """Property value if available"""
+        return (self.property_details or {}).get('property_value', 0)
+    
+    @cached_property
+    def loan_amount(self):
+        """Requested loan amount if available"""
+        return (self.loan_requirements or {}).get('loan_amount_needed', 0)
+    
+    @cached_property
+    def loan_purpose(self):
+        """Loan purpose if available"""
+        return (self.loan_requirements or {}).get('loan_purpose', 'Not specified')
+    
+    @cached_property
+    def ltv_ratio(self):
+        """Loan-to-value ratio as a percentage"""
+        property_value = self.property_value
+        loan_amount = self.loan_amount
+        
+        if property_value > 0 and loan_amount > 0:
+            return (loan_amount / property_value) * 100
+        return 0
+    
     def get_property_value(self):
         """Get property value if available"""
-        return self.property_details.get('property_value', 0)
+        return self.property_value
     
     def get_loan_amount(self):
         """Get requested loan amount if available"""
-        return self.loan_requirements.get('loan_amount_needed', 0)
+        return self.loan_amount
     
     def get_loan_purpose(self):
         """Get loan purpose if available"""
-        return self.loan_requirements.get('loan_purpose', 'Not specified')
+        return self.loan_purpose
     
     def get_ltv_ratio(self):
         """Calculate loan-to-value ratio"""
-        property_value = self.get_property_value()
-        loan_amount = self.get_loan_amount()
-        
-        if property_value > 0 and loan_amount > 0:
-            return (loan_amount / property_value) * 100
-        return 0
+        return self.ltv_ratio
+    
+    def to_profile_dict(self):
+        """Customer profile as passed to the conversation engine"""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "phone_number": self.phone_number,
+            "preferred_language": self.preferred_language,
+            "property_details": self.property_details,
+            "loan_requirements": self.loan_requirements,
+            "conversation_state": self.conversation_state,
+            "interest_level": self.interest_level,
+            "do_not_contact": self.do_not_contact
+        }
     
     def record_consent(self, consent_type, given=True):
         """Record customer consent"""
-        consents = self.consents or {}
-        
-        consents[consent_type] = {
+        now = timezone.now()
+        consent = {
             'given': given,
-            'timestamp': timezone.now().isoformat(),
+            'timestamp': now.isoformat(),
             'channel': 'whatsapp'
         }
         
+        # Set the key server-side so the rest of the consents blob is not rewritten
+        Customer.objects.filter(pk=self.pk).update(
+            consents=JSONSetKey('consents', consent_type, consent),
+            updated_at=now
+        )
+        
+        consents = self.consents or {}
+        consents[consent_type] = consent
         self.consents = consents
-        self.save(update_fields=['consents', 'updated_at'])
+        self.updated_at = now
+        _clear_cached_properties(self, 'consents_pretty')
 
 
 class Interaction(models.Model):
@@ -109,6 +269,9 @@ class Interaction(models.Model):
     ai_confidence = models.FloatField(default=1.0)
     ai_analysis = models.JSONField(default=dict, blank=True)
     
+    # Full-text index of content, maintained by a database trigger on PostgreSQL
+    search_vector = SearchVectorField(null=True, editable=False)
+    
     class Meta:
         verbose_name = 'Interaction'
         verbose_name_plural = 'Interactions'
@@ -117,10 +280,20 @@ class Interaction(models.Model):
             models.Index(fields=['-timestamp']),
             models.Index(fields=['customer', '-timestamp']),
             models.Index(fields=['detected_intent']),
+            models.Index(fields=['direction', 'timestamp']),
         ]
     
     def __str__(self):
         return f"{self.customer} - {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        _clear_cached_properties(self, 'ai_analysis_pretty')
+    
+    @cached_property
+    def ai_analysis_pretty(self):
+        """Pretty-printed AI analysis"""
+        return pretty_json(self.ai_analysis)
 
 
 class FollowUp(models.Model):
@@ -162,6 +335,7 @@ class FollowUp(models.Model):
         ordering = ['-scheduled_date']
         indexes = [
             models.Index(fields=['scheduled_date', 'status']),
+            models.Index(fields=['status', 'scheduled_date']),
             models.Index(fields=['customer', 'status']),
         ]
     
@@ -200,6 +374,15 @@ class Template(models.Model):
     
     def __str__(self):
         return f"{self.name} ({self.language_code})"
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        _clear_cached_properties(self, 'sample_values_pretty')
+    
+    @cached_property
+    def sample_values_pretty(self):
+        """Pretty-printed sample placeholder values"""
+        return pretty_json(self.sample_values)
 
 
 class Campaign(models.Model):
@@ -242,6 +425,15 @@ class Campaign(models.Model):
     
     def __str__(self):
         return self.name
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        _clear_cached_properties(self, 'target_criteria_pretty')
+    
+    @cached_property
+    def target_criteria_pretty(self):
+        """Pretty-printed target criteria"""
+        return pretty_json(self.target_criteria)
 
 
 class CampaignTarget(models.Model):
@@ -274,6 +466,9 @@ class CampaignTarget(models.Model):
         verbose_name = 'Campaign Target'
         verbose_name_plural = 'Campaign Targets'
         unique_together = ('campaign', 'customer')
+        indexes = [
+            models.Index(fields=['campaign', 'status']),
+        ]
     
     def __str__(self):
         return f"{self.customer} - {self.campaign.name}"
@@ -300,4 +495,18 @@ class ConversationState(models.Model):
         verbose_name_plural = 'Conversation States'
     
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        _clear_cached_properties(self, 'possible_transitions_pretty', 'prompts_pretty')
+    
+    @cached_property
+    def possible_transitions_pretty(self):
+        """Pretty-printed possible transitions"""
+        return pretty_json(self.possible_transitions)
+    
+    @cached_property
+    def prompts_pretty(self):
+        """Pretty-printed state prompts"""
+        return pretty_json(self.prompts)
\ No newline at end of file
@@ -1,116 +1,220 @@
 # agent/tasks.py
 
 import logging
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict
 from datetime import timedelta
+from functools import cache
+from itertools import islice
+from pathlib import Path
 
+from django.conf import settings
 from django.utils import timezone
-from django.db.models import Q
+from django.db.models import Count, F, Q
 
-from celery import shared_task
+from celery import chord, shared_task
 
 from .models import Customer, Interaction, FollowUp, Campaign, CampaignTarget, Template
 from core.client_factory import get_whatsapp_client
-from core.conversation import ConversationEngine
-from core.language import LanguageProcessor
+from core.conversation import FollowupContext, get_conversation_engine
 from core.audio import AudioProcessor
+from core.rate_limit import acquire_token
 
 logger = logging.getLogger('agent.tasks')
 
-# Initialize components
-whatsapp_client = get_whatsapp_client()
-language_processor = LanguageProcessor()
-audio_processor = AudioProcessor()
-
-# Initialize conversation engines for different languages
-conversation_engines = {
-    "english": ConversationEngine(language="english"),
-    "hindi": ConversationEngine(language="hindi"),
-    "kannada": ConversationEngine(language="kannada"),
-    "tamil": ConversationEngine(language="tamil"),
-    "telugu": ConversationEngine(language="telugu")
+
+# Read receipts are sent from here while the message is processed
+_receipt_pool = ThreadPoolExecutor(max_workers=4)
+
+
+# Components are created on first use, so workers that never run these
+# tasks do not pay for them at startup
+@cache
+def _whatsapp_client():
+    """Shared WhatsApp client for the tasks"""
+    return get_whatsapp_client()
+
+
+@cache
+def _audio_processor():
+    """Shared audio processor for the tasks"""
+    return AudioProcessor()
+
+
+# Change in interest level per recent inbound message with each intent
+INTENT_WEIGHTS = {
+    "interested": 0.2,
+    "needs_more_info": 0.1,
+    "objection": -0.1,
+    "not_interested": -0.3
 }
 
-@shared_task
-def process_scheduled_followups():
-    """Process all follow-ups scheduled for today"""
-    logger.info("Starting scheduled follow-up processing")
+# Rows loaded, sent and written per batch by the bulk tasks
+TASK_CHUNK_SIZE = 1000
+
+# Targets handled by each send_campaign_chunk subtask
+CAMPAIGN_SHARD_SIZE = 200
+
+# Redis key of the send budget shared by all workers
+SEND_RATE_KEY = "whatsapp:send"
+
+
+def _chunked(iterable, size):
+    """Yield lists of up to size items from an iterable"""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class SendRateLimiter:
+    """Spaces outgoing API calls evenly across the threads of one task"""
     
-    # Find all pending follow-ups that are due
-    now = timezone.now()
-    followups = FollowUp.objects.filter(
-        status="pending",
-        scheduled_date__lte=now
-    ).select_related('customer')
+    def __init__(self, rate_per_second):
+        self.interval = 1.0 / rate_per_second
+        self.lock = threading.Lock()
+        self.next_slot = time.monotonic()
     
-    logger.info(f"Found {followups.count()} follow-ups to process")
+    def wait(self):
+        """Block until the caller may make its next call"""
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        
+        if delay > 0:
+            time.sleep(delay)
+
+
+def send_in_parallel(send, items):
+    """
+    Run a network-bound send function over items on a thread pool
+    
+    Calls share a WHATSAPP_SEND_RATE per second budget with every other
+    worker through Redis, or are paced locally if Redis is unavailable.
+    Database writes should stay in the caller, which consumes the results
+    in order.
+    
+    Args:
+        send: Function taking one item
+        items: Items to send
+        
+    Returns:
+        Iterator of (item, result, error) tuples
+    """
+    limiter = SendRateLimiter(settings.WHATSAPP_SEND_RATE)
+    shared_limit = True
+    
+    def call(item):
+        nonlocal shared_limit
+        if not (shared_limit and acquire_token(SEND_RATE_KEY, settings.WHATSAPP_SEND_RATE)):
+            shared_limit = False
+            limiter.wait()
+        try:
+            return send(item), None
+        except Exception as e:
+            return None, e
+    
+    with ThreadPoolExecutor(max_workers=settings.WHATSAPP_SEND_WORKERS) as pool:
+        for item, (result, error) in zip(items, pool.map(call, items)):
+            yield item, result, error
+
+
+def _send_followup(followup, now):
+    """Generate and send one follow-up message, returning the engine response and send results"""
+    customer = followup.customer
+    
+    # Get customer's preferred language
+    language = customer.preferred_language or "english"
+    
+    # Prepare follow-up context
+    followup_context = FollowupContext(
+        customer_name=customer.name or "there",
+        last_state=customer.conversation_state,
+        follow_up_reason=followup.follow_up_reason,
+        days_since_contact=(now - customer.last_contacted).days,
+        property_details=customer.property_details,
+        loan_requirements=customer.loan_requirements
+    )
+    
+    # Generate follow-up message
+    response = get_conversation_engine().generate_followup(followup_context, language)
+    
+    # Send the message
+    result = _whatsapp_client().send_text(customer.phone_number, response["text"])
+    
+    # If audio message would be more effective, send that too
+    audio_result = None
+    if result.ok and response.get("should_generate_audio", False):
+        audio_result = _audio_processor().generate_audio_response(response["text"], language)
+        
+        if audio_result["success"]:
+            _whatsapp_client().send_audio(customer.phone_number, audio_result["audio_path"])
+    
+    return language, response, result, audio_result
+
+
+def _process_followups(followups, now):
+    """
+    Send a batch of due follow-ups and save the results
+    
+    Args:
+        followups: FollowUp instances with their customer loaded
+        now: Time the task started
+    """
+    # Collect changes and write them in batches after the loop
+    to_update_followups = []
+    to_update_customers = []
+    to_send = []
+    pending_interactions = []
     
     for followup in followups:
+        # Skip if customer has do_not_contact flag
+        if followup.customer.do_not_contact:
+            followup.status = "cancelled"
+            followup.result_notes = "Customer has do_not_contact flag"
+            to_update_followups.append(followup)
+        else:
+            to_send.append(followup)
+    
+    sends = send_in_parallel(lambda followup: _send_followup(followup, now), to_send)
+    
+    for followup, sent, error in sends:
         try:
-            # Skip if customer has do_not_contact flag
-            if followup.customer.do_not_contact:
-                followup.status = "cancelled"
-                followup.result_notes = "Customer has do_not_contact flag"
-                followup.save(update_fields=["status", "result_notes"])
-                continue
-            
-            # Get customer's preferred language
-            language = followup.customer.preferred_language or "english"
-            
-            # Get appropriate conversation engine
-            engine = conversation_engines.get(language, conversation_engines["english"])
-            
-            # Prepare follow-up context
-            followup_context = {
-                "customer_name": followup.customer.name or "there",
-                "last_state": followup.customer.conversation_state,
-                "follow_up_reason": followup.follow_up_reason,
-                "days_since_contact": (now - followup.customer.last_contacted).days,
-                "property_details": followup.customer.property_details,
-                "loan_requirements": followup.customer.loan_requirements
-            }
-            
-            # Generate follow-up message
-            response = engine.generate_followup(followup_context, language)
+            if error is not None:
+                raise error
             
-            # Send the message
-            result = whatsapp_client.send_text(followup.customer.phone_number, response["text"])
+            language, response, result, audio_result = sent
             
             # If message was sent successfully
-            if "error" not in result:
+            if result.ok:
                 # Record the interaction
-                Interaction.objects.create(
+                pending_interactions.append(Interaction(
                     customer=followup.customer,
                     timestamp=now,
                     direction="outbound",
                     message_type="text",
                     content=response["text"],
                     language=language,
-                    whatsapp_message_id=result.get("messages", [{}])[0].get("id") if "messages" in result else None,
+                    whatsapp_message_id=result.message_id,
                     conversation_state=response.get("new_state", followup.customer.conversation_state),
                     detected_intent="follow_up"
-                )
+                ))
                 
-                # If audio message would be more effective, send that too
-                if response.get("should_generate_audio", False):
-                    audio_result = audio_processor.generate_audio_response(response["text"], language)
-                    
-                    if audio_result["success"]:
-                        # Send audio message
-                        whatsapp_client.send_audio(followup.customer.phone_number, audio_result["audio_path"])
-                        
-                        # Record the audio interaction
-                        Interaction.objects.create(
-                            customer=followup.customer,
-                            timestamp=timezone.now(),
-                            direction="outbound",
-                            message_type="audio",
-                            content=f"Audio version of: {response['text'][:100]}...",
-                            media_url=audio_result["audio_path"],
-                            language=language,
-                            conversation_state=response.get("new_state", followup.customer.conversation_state),
-                            detected_intent="follow_up"
-                        )
+                if audio_result and audio_result["success"]:
+                    # Record the audio interaction
+                    pending_interactions.append(Interaction(
+                        customer=followup.customer,
+                        timestamp=now,
+                        direction="outbound",
+                        message_type="audio",
+                        content=f"Audio version of: {response['text'][:100]}...",
+                        media_url=audio_result["audio_path"],
+                        language=language,
+                        conversation_state=response.get("new_state", followup.customer.conversation_state),
+                        detected_intent="follow_up"
+                    ))
                 
                 # Update follow-up status
                 followup.status = "sent"
@@ -119,25 +223,285 @@ def process_scheduled_followups():
                 # Update customer record
                 followup.customer.last_contacted = now
                 followup.customer.conversation_state = response.get("new_state", followup.customer.conversation_state)
-                followup.customer.save(update_fields=["last_contacted", "conversation_state"])
+                to_update_customers.append(followup.customer)
             else:
                 # Record failure
                 followup.status = "failed"
-                followup.result_notes = f"Failed to send follow-up: {result.get('error', 'Unknown error')}"
-            
-            # Save the updated follow-up
-            followup.save(update_fields=["status", "result_notes"])
-            
-            # Delay between follow-ups to respect rate limits
-            time.sleep(1)
+                followup.result_notes = f"Failed to send follow-up: {result.error or 'Unknown error'}"
             
         except Exception as e:
             logger.error(f"Error processing follow-up {followup.id}: {str(e)}")
             followup.status = "failed"
             followup.result_notes = f"Error: {str(e)}"
-            followup.save(update_fields=["status", "result_notes"])
+        
+        to_update_followups.append(followup)
+    
+    # Save the recorded interactions, updated follow-ups and customers
+    Interaction.objects.bulk_create(pending_interactions, batch_size=500)
+    FollowUp.objects.bulk_update(to_update_followups, ["status", "result_notes"], batch_size=500)
+    Customer.objects.bulk_update(to_update_customers, ["last_contacted", "conversation_state"], batch_size=500)
+
+
+@shared_task
+def process_inbound_message(message):
+    """
+    Process one message received on the WhatsApp webhook
+    
+    Args:
+        message: Message object from the webhook payload
+    """
+    from .views import process_text_message, process_audio_message
+    
+    sender = message["from"]
+    message_type = message["type"]
+    message_id = message["id"]
+    timestamp = message.get("timestamp")
+    
+    # Mark the message as read in the background, so the reply does not wait for the receipt
+    _receipt_pool.submit(_whatsapp_client().mark_message_read, message_id)
+    
+    # Process different message types
+    if message_type == "text":
+        message_content = message["text"]["body"]
+        process_text_message(sender, message_content, message_id, timestamp)
+    elif message_type == "audio":
+        # Get the media ID
+        media_id = message["audio"]["id"]
+        # Download the audio
+        process_audio_message(sender, media_id, message_id, timestamp)
+    else:
+        # Skip other message types for now
+        logger.info(f"Received unsupported message type: {message_type}")
+
+
+@shared_task
+def audio_reply(customer_id, response_text, language, intent, state):
+    """
+    Send the audio version of a text reply that has already gone out
+    
+    Args:
+        customer_id: ID of the customer to send to
+        response_text: Text of the reply, in the customer's language
+        language: Language of the reply
+        intent: Detected intent of the message being answered
+        state: Conversation state after the reply
+    """
+    customer = Customer.objects.get(id=customer_id)
+    
+    audio_result = _audio_processor().generate_audio_response(response_text, language)
+    if not audio_result["success"]:
+        logger.error(f"Failed to generate audio reply for {customer.phone_number}: {audio_result.get('error')}")
+        return
+    
+    # Send audio message
+    _whatsapp_client().send_audio(customer.phone_number, audio_result["audio_path"])
+    
+    # Record the audio interaction
+    Interaction.objects.create(
+        customer=customer,
+        timestamp=timezone.now(),
+        direction="outbound",
+        message_type="audio",
+        content=f"Audio version of: {response_text[:100]}...",
+        media_url=audio_result["audio_path"],
+        language=language,
+        detected_intent=intent,
+        conversation_state=state
+    )
+
+
+@shared_task
+def process_scheduled_followups():
+    """Process all follow-ups scheduled for today"""
+    logger.info("Starting scheduled follow-up processing")
+    
+    # Find all pending follow-ups that are due
+    now = timezone.now()
+    followups = FollowUp.objects.filter(
+        status="pending",
+        scheduled_date__lte=now
+    ).select_related('customer')
+    
+    # Stream the follow-ups so only one chunk is held in memory
+    processed = 0
+    for chunk in _chunked(followups.iterator(chunk_size=TASK_CHUNK_SIZE), TASK_CHUNK_SIZE):
+        _process_followups(chunk, now)
+        processed += len(chunk)
+    
+    logger.info(f"Processed {processed} follow-ups")
+    
+    return {"processed": processed}
+
+
+def _send_campaign_target(target, template):
+    """Send the campaign template to one target, returning the language used and the send result"""
+    # Get customer's preferred language
+    language = target.customer.preferred_language or "english"
+    
+    # Prepare template parameters
+    template_params = {
+        "name": target.customer.name or "there",
+        "property_type": target.customer.property_details.get("property_type", "property") if target.customer.property_details else "property"
+    }
     
-    return {"processed": followups.count()}
+    # Send the template message
+    result = _whatsapp_client().send_template(
+        target.customer.phone_number,
+        template.name,
+        template_params
+    )
+    
+    return language, result
+
+
+def _process_campaign_targets(campaign, template, targets, now):
+    """
+    Send a campaign's template to a batch of targets and save the results
+    
+    Args:
+        campaign: Campaign being processed
+        template: The campaign's template
+        targets: CampaignTarget instances with their customer loaded
+        now: Time the task started
+        
+    Returns:
+        Number of messages sent
+    """
+    sent_count = 0
+    to_send = []
+    pending_interactions = []
+    interaction_content = f"Campaign: {campaign.name}, Template: {template.name}"
+    
+    # Collect changes and write them in batches after the loop
+    sent_targets = []
+    failed_targets = []
+    contacted_customer_ids = set()
+    
+    for target in targets:
+        # Skip if customer has do_not_contact flag
+        if target.customer.do_not_contact:
+            target.status = "excluded"
+            target.error_message = "Customer has do_not_contact flag"
+            failed_targets.append(target)
+        else:
+            to_send.append(target)
+    
+    # Process each target as its send completes
+    sends = send_in_parallel(lambda target: _send_campaign_target(target, template), to_send)
+    
+    for target, sent, error in sends:
+        try:
+            if error is not None:
+                raise error
+            
+            language, result = sent
+            
+            # Update target status
+            if result.ok:
+                target.status = "sent"
+                target.message_id = result.message_id
+                target.sent_time = now
+                target.delivery_status = "sent"
+                
+                # Record the interaction
+                pending_interactions.append(Interaction(
+                    customer=target.customer,
+                    timestamp=now,
+                    direction="outbound",
+                    message_type="template",
+                    content=interaction_content,
+                    whatsapp_message_id=result.message_id,
+                    language=language,
+                    detected_intent="campaign"
+                ))
+                
+                sent_count += 1
+                sent_targets.append(target)
+            else:
+                target.status = "failed"
+                target.error_message = result.error or "Unknown error"
+                failed_targets.append(target)
+            
+            # Update customer record
+            target.customer.last_contacted = now
+            contacted_customer_ids.add(target.customer_id)
+            
+        except Exception as e:
+            logger.error(f"Error processing target {target.id}: {str(e)}")
+            target.status = "failed"
+            target.error_message = str(e)
+            failed_targets.append(target)
+    
+    # Save the updated targets and customers
+    CampaignTarget.objects.bulk_update(
+        sent_targets, ["status", "message_id", "sent_time", "delivery_status"], batch_size=500
+    )
+    CampaignTarget.objects.bulk_update(failed_targets, ["status", "error_message"], batch_size=500)
+    if contacted_customer_ids:
+        Customer.objects.filter(id__in=contacted_customer_ids).update(last_contacted=now)
+    
+    # Save the recorded interactions and count them against the campaign
+    Interaction.objects.bulk_create(pending_interactions, batch_size=500)
+    if sent_count:
+        Campaign.objects.filter(pk=campaign.pk).update(total_sent=F("total_sent") + sent_count)
+    
+    return sent_count
+
+
+# The chord collects these results for finalize_campaign
+@shared_task(ignore_result=False)
+def send_campaign_chunk(campaign_id, target_ids):
+    """
+    Send a campaign's template to one shard of its pending targets
+    
+    Args:
+        campaign_id: ID of the campaign being processed
+        target_ids: IDs of the CampaignTarget rows in this shard
+    """
+    try:
+        campaign = Campaign.objects.select_related('template').get(pk=campaign_id)
+        
+        # Skip targets another run has already handled
+        targets = list(CampaignTarget.objects.filter(
+            id__in=target_ids,
+            status="pending"
+        ).select_related('customer'))
+        
+        sent = _process_campaign_targets(campaign, campaign.template, targets, timezone.now())
+    except Exception as e:
+        # A raising shard would keep the chord from ever calling finalize_campaign
+        logger.error(f"Error sending campaign {campaign_id} shard of {len(target_ids)} targets: {str(e)}")
+        return {"processed": len(target_ids), "sent": 0, "failed": True}
+    
+    # Targets skipped above are no longer pending either
+    return {"processed": len(target_ids), "sent": sent}
+
+
+@shared_task
+def finalize_campaign(results, campaign_id, total_pending):
+    """
+    Mark a campaign completed once all of its shards have run
+    
+    Args:
+        results: Return values of the send_campaign_chunk shards
+        campaign_id: ID of the campaign being processed
+        total_pending: Number of targets dispatched to the shards
+    """
+    processed = sum(result["processed"] for result in results)
+    sent = sum(result["sent"] for result in results)
+    failed_shards = sum(1 for result in results if result.get("failed"))
+    
+    if failed_shards:
+        # Targets whose results a failed shard did not save are still pending; running the campaign again retries them
+        logger.error(f"Campaign {campaign_id}: {failed_shards} of {len(results)} shards failed")
+        Campaign.objects.filter(pk=campaign_id).update(status="scheduled")
+    elif processed >= total_pending:
+        # All dispatched targets have been processed
+        Campaign.objects.filter(pk=campaign_id).update(status="completed")
+    
+    logger.info(f"Campaign {campaign_id} finished: {sent} messages sent")
+    
+    return {"campaign_id": campaign_id, "sent": sent}
 
 
 @shared_task
@@ -163,103 +527,29 @@ def process_campaign(campaign_id):
         campaign.status = "running"
         campaign.save(update_fields=["status"])
         
-        # Get the campaign template
-        template = campaign.template
-        
-        # Get pending targets
-        targets = CampaignTarget.objects.filter(
+        # Shard the pending targets across workers
+        target_ids = CampaignTarget.objects.filter(
             campaign=campaign,
             status="pending"
-        ).select_related('customer')
+        ).values_list("id", flat=True)
         
-        logger.info(f"Found {targets.count()} pending targets for campaign {campaign_id}")
+        shards = []
+        total_pending = 0
+        for shard in _chunked(target_ids.iterator(chunk_size=TASK_CHUNK_SIZE), CAMPAIGN_SHARD_SIZE):
+            shards.append(send_campaign_chunk.s(campaign_id, shard))
+            total_pending += len(shard)
         
-        # Process each target
-        for target in targets:
-            try:
-                # Skip if customer has do_not_contact flag
-                if target.customer.do_not_contact:
-                    target.status = "excluded"
-                    target.error_message = "Customer has do_not_contact flag"
-                    target.save(update_fields=["status", "error_message"])
-                    continue
-                
-                # Get customer's preferred language
-                language = target.customer.preferred_language or "english"
-                language_code = language[:2] if language != "english" else "en"
-                
-                # Prepare template parameters
-                template_params = {
-                    "name": target.customer.name or "there",
-                    "property_type": target.customer.property_details.get("property_type", "property") if target.customer.property_details else "property"
-                }
-                
-                # Send the template message
-                result = whatsapp_client.send_template(
-                    target.customer.phone_number,
-                    template.name,
-                    template_params
-                )
-                
-                # Update target status
-                if "error" not in result:
-                    message_id = result.get("messages", [{}])[0].get("id") if "messages" in result else None
-                    
-                    target.status = "sent"
-                    target.message_id = message_id
-                    target.sent_time = timezone.now()
-                    target.delivery_status = "sent"
-                    
-                    # Record the interaction
-                    Interaction.objects.create(
-                        customer=target.customer,
-                        timestamp=timezone.now(),
-                        direction="outbound",
-                        message_type="template",
-                        content=f"Campaign: {campaign.name}, Template: {template.name}",
-                        whatsapp_message_id=message_id,
-                        language=language,
-                        detected_intent="campaign"
-                    )
-                    
-                    # Update campaign statistics
-                    campaign.total_sent += 1
-                else:
-                    target.status = "failed"
-                    target.error_message = result.get("error", "Unknown error")
-                
-                # Save the updated target
-                target.save()
-                
-                # Update customer record
-                target.customer.last_contacted = timezone.now()
-                target.customer.save(update_fields=["last_contacted"])
-                
-                # Respect rate limits
-                time.sleep(1)
-                
-            except Exception as e:
-                logger.error(f"Error processing target {target.id}: {str(e)}")
-                target.status = "failed"
-                target.error_message = str(e)
-                target.save(update_fields=["status", "error_message"])
+        logger.info(f"Dispatching {total_pending} pending targets in {len(shards)} shards for campaign {campaign_id}")
         
-        # Check if all targets have been processed
-        pending_count = CampaignTarget.objects.filter(
-            campaign=campaign,
-            status="pending"
-        ).count()
-        
-        if pending_count == 0:
-            campaign.status = "completed"
-        
-        # Save campaign statistics
-        campaign.save(update_fields=["status", "total_sent"])
+        if shards:
+            chord(shards)(finalize_campaign.s(campaign_id, total_pending))
+        else:
+            finalize_campaign([], campaign_id, 0)
         
         return {
             "campaign_id": campaign_id,
-            "processed": targets.count(),
-            "sent": campaign.total_sent
+            "processed": total_pending,
+            "shards": len(shards)
         }
         
     except Campaign.DoesNotExist:
@@ -284,51 +574,37 @@ def cleanup_old_data():
     
     now = timezone.now()
     
-    # Delete old interactions for prospects
     prospect_cutoff = now - timedelta(days=retention_periods["prospect_interactions"])
-    prospect_customers = Customer.objects.filter(
-        ~Q(conversation_state__in=["completed", "not_interested"]),
-        interactions__timestamp__lt=prospect_cutoff
-    )
-    
-    for customer in prospect_customers:
-        old_interactions = Interaction.objects.filter(
-            customer=customer,
-            timestamp__lt=prospect_cutoff
-        )
-        count = old_interactions.count()
-        old_interactions.delete()
-        logger.info(f"Deleted {count} old interactions for prospect {customer.id}")
-    
-    # Delete old interactions for completed customers
     completed_cutoff = now - timedelta(days=retention_periods["completed_interactions"])
-    old_completed_interactions = Interaction.objects.filter(
-        customer__conversation_state="completed",
-        timestamp__lt=completed_cutoff
-    )
-    count = old_completed_interactions.count()
-    old_completed_interactions.delete()
-    logger.info(f"Deleted {count} old interactions for completed customers")
-    
-    # Delete old interactions for not interested customers
     not_interested_cutoff = now - timedelta(days=retention_periods["not_interested_interactions"])
-    old_not_interested_interactions = Interaction.objects.filter(
-        customer__conversation_state="not_interested",
-        timestamp__lt=not_interested_cutoff
-    )
-    count = old_not_interested_interactions.count()
-    old_not_interested_interactions.delete()
-    logger.info(f"Deleted {count} old interactions for not interested customers")
+    
+    # Delete old interactions for every retention bucket in one statement
+    count, _ = Interaction.objects.filter(
+        Q(customer__conversation_state="completed", timestamp__lt=completed_cutoff)
+        | Q(customer__conversation_state="not_interested", timestamp__lt=not_interested_cutoff)
+        | (~Q(customer__conversation_state__in=["completed", "not_interested"]) & Q(timestamp__lt=prospect_cutoff))
+    ).delete()
+    logger.info(f"Deleted {count} old interactions")
     
     # Delete old completed follow-ups
-    old_followups = FollowUp.objects.filter(
+    count, _ = FollowUp.objects.filter(
         status__in=["sent", "cancelled", "failed"],
         scheduled_date__lt=not_interested_cutoff
-    )
-    count = old_followups.count()
-    old_followups.delete()
+    ).delete()
     logger.info(f"Deleted {count} old follow-ups")
     
+    # Delete cached speech audio that has not been used recently
+    tts_cutoff = time.time() - settings.TTS_CACHE_DAYS * 24 * 60 * 60
+    count = 0
+    for audio_file in Path(settings.TTS_CACHE_DIR).glob("*.mp3"):
+        try:
+            if audio_file.stat().st_mtime < tts_cutoff:
+                audio_file.unlink()
+                count += 1
+        except FileNotFoundError:
+            pass
+    logger.info(f"Deleted {count} cached speech files")
+    
     return {"status": "completed"}
 
 
@@ -337,49 +613,38 @@ def update_customer_interest_levels():
     """Update customer interest levels based on recent activity"""
     logger.info("Starting customer interest level update task")
     
-    # Get customers with recent activity
+    # Count recent inbound intents per customer in a single grouped query
     recent_cutoff = timezone.now() - timedelta(days=30)
-    active_customers = Customer.objects.filter(
-        interactions__timestamp__gte=recent_cutoff
-    ).distinct()
+    intent_rows = Interaction.objects.filter(
+        timestamp__gte=recent_cutoff,
+        direction="inbound"
+    ).order_by().values("customer_id", "detected_intent").annotate(c=Count("id"))
     
-    for customer in active_customers:
-        try:
-            # Get recent interactions
-            recent_interactions = Interaction.objects.filter(
-                customer=customer,
-                timestamp__gte=recent_cutoff
-            ).order_by('timestamp')
-            
-            if not recent_interactions:
-                continue
-            
-            # Calculate interest level based on recent intents
-            interest_factor = 0
-            
-            for interaction in recent_interactions:
-                if interaction.direction == "inbound":
-                    if interaction.detected_intent == "interested":
-                        interest_factor += 0.2
-                    elif interaction.detected_intent == "needs_more_info":
-                        interest_factor += 0.1
-                    elif interaction.detected_intent == "objection":
-                        interest_factor -= 0.1
-                    elif interaction.detected_intent == "not_interested":
-                        interest_factor -= 0.3
-            
-            # Normalize interest factor
-            interest_factor = max(-1.0, min(1.0, interest_factor))
-            
-            # Update customer interest level
-            new_interest_level = max(0.0, min(1.0, customer.interest_level + interest_factor))
-            
-            if new_interest_level != customer.interest_level:
-                customer.interest_level = new_interest_level
-                customer.save(update_fields=["interest_level"])
-                logger.info(f"Updated interest level for customer {customer.id} to {new_interest_level}")
-            
-        except Exception as e:
-            logger.error(f"Error updating interest level for customer {customer.id}: {str(e)}")
+    intent_counts = defaultdict(lambda: defaultdict(int))
+    for row in intent_rows:
+        intent_counts[row["customer_id"]][row["detected_intent"]] += row["c"]
+    
+    customers = Customer.objects.filter(id__in=intent_counts).only("id", "interest_level")
+    changed = []
+    
+    for customer in customers:
+        # Calculate interest level based on recent intents
+        interest_factor = sum(
+            INTENT_WEIGHTS.get(intent, 0.0) * count
+            for intent, count in intent_counts[customer.id].items()
+        )
+        
+        # Normalize interest factor
+        interest_factor = max(-1.0, min(1.0, interest_factor))
+        
+        # Update customer interest level
+        new_interest_level = max(0.0, min(1.0, customer.interest_level + interest_factor))
+        
+        if new_interest_level != customer.interest_level:
+            customer.interest_level = new_interest_level
+            changed.append(customer)
+    
+    Customer.objects.bulk_update(changed, ["interest_level"], batch_size=500)
+    logger.info("Updated interest level for %d of %d active customers", len(changed), len(intent_counts))
     
-    return {"processed": active_customers.count()}
\ No newline at end of file
+    return {"processed": len(intent_counts)}
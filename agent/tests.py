@@ -1,3 +1,80 @@
-from django.test import TestCase
+from django.db.models import JSONField, Value
+from django.test import SimpleTestCase, TestCase
 
-# Create your tests here.
+from agent.models import Customer
+from core.conversation import ConversationEngine
+
+
+class IntentKeywordTests(SimpleTestCase):
+    """Short messages settled by the intent phrases without a model call"""
+
+    def setUp(self):
+        # Only the class patterns are used, so no clients are needed
+        self.engine = ConversationEngine.__new__(ConversationEngine)
+
+    def test_negated_interest_is_not_interested(self):
+        for message in [
+            "not interested",
+            "I'm not really interested",
+            "no longer interested",
+            "not at all interested",
+            "don't want to proceed",
+            "never interested",
+        ]:
+            with self.subTest(message=message):
+                self.assertEqual(
+                    self.engine._match_intent_keywords(message),
+                    ConversationEngine.Intent.NOT_INTERESTED,
+                )
+
+    def test_negated_message_is_never_interested(self):
+        for message in ["can't proceed", "no, go ahead later"]:
+            with self.subTest(message=message):
+                self.assertNotEqual(
+                    self.engine._match_intent_keywords(message),
+                    ConversationEngine.Intent.INTERESTED,
+                )
+
+    def test_negation_elsewhere_is_left_to_the_model(self):
+        # The negation does not apply to the interest, so neither intent is settled here
+        for message in ["not sure but I'm interested", "never mind, I'm interested"]:
+            with self.subTest(message=message):
+                self.assertIsNone(self.engine._match_intent_keywords(message))
+
+    def test_plain_interest_is_interested(self):
+        for message in [
+            "yes",
+            "I am interested",
+            "go ahead",
+            "ok proceed",
+            "I want to proceed",
+            "loan amount is fine, go ahead",
+        ]:
+            with self.subTest(message=message):
+                self.assertEqual(
+                    self.engine._match_intent_keywords(message),
+                    ConversationEngine.Intent.INTERESTED,
+                )
+
+
+class RecordConsentTests(TestCase):
+    """Consents are set key by key in the database"""
+
+    def test_consents_recorded_twice_are_both_stored(self):
+        customer = Customer.objects.create(phone_number="919876543210")
+        customer.record_consent("marketing")
+        customer.record_consent("data_sharing", given=False)
+
+        consents = Customer.objects.get(pk=customer.pk).consents
+        self.assertEqual(set(consents), {"marketing", "data_sharing"})
+        self.assertIs(consents["marketing"]["given"], True)
+        self.assertIs(consents["data_sharing"]["given"], False)
+        self.assertEqual(consents["marketing"]["channel"], "whatsapp")
+
+    def test_consent_recorded_over_json_null(self):
+        customer = Customer.objects.create(phone_number="919876543211")
+        Customer.objects.filter(pk=customer.pk).update(consents=Value(None, JSONField()))
+        customer.record_consent("marketing")
+
+        consents = Customer.objects.get(pk=customer.pk).consents
+        self.assertEqual(list(consents), ["marketing"])
@@ -1,40 +1,57 @@
 # agent/views.py
+#
+# The handlers here are I/O-bound: webhook dispatch, ORM reads and writes,
+# Celery task launches and calls to the WhatsApp and OpenAI APIs. Speed them
+# up by moving work to tasks, batching queries and overlapping API calls;
+# there is no numeric code here for a JIT compiler to help with.
 
 import json
 import logging
-import os
-import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
+from functools import cache
 
 from django.http import HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.utils import timezone
 from django.conf import settings
+from django.db import transaction
+from django.db.models import F
 
-from .models import Customer, Interaction, FollowUp, CampaignTarget
+from .models import Customer, Interaction, FollowUp, Campaign, CampaignTarget, normalize_phone_number
 from core.client_factory import get_whatsapp_client
 from core.utils import is_simulation_mode
-from core.whatsapp import WhatsAppClient
-from core.conversation import ConversationEngine
-from core.language import LanguageProcessor
+from core.conversation import ConversationEngine, get_conversation_engine
+from core.language import LanguageProcessor, SUPPORTED_LANGUAGES
 from core.audio import AudioProcessor
+from .tasks import audio_reply, process_inbound_message
 
 logger = logging.getLogger('agent.views')
 
-# Initialize components
-whatsapp_client = get_whatsapp_client()
-language_processor = LanguageProcessor()
-audio_processor = AudioProcessor()
+# Threads for API calls that can overlap with database work in a handler
+_io_pool = ThreadPoolExecutor(max_workers=8)
+
+
+# Clients and processors are created on first use, so importing
+# the views does no setup work and a worker only holds what its messages need
+@cache
+def get_client():
+    """Shared WhatsApp client for the views"""
+    return get_whatsapp_client()
+
+
+@cache
+def get_language_processor():
+    """Shared language processor for the views"""
+    return LanguageProcessor()
+
+
+@cache
+def get_audio_processor():
+    """Shared audio processor for the views"""
+    return AudioProcessor()
 
-# Initialize conversation engines for different languages
-conversation_engines = {
-    "english": ConversationEngine(language="english"),
-    "hindi": ConversationEngine(language="hindi"),
-    "kannada": ConversationEngine(language="kannada"),
-    "tamil": ConversationEngine(language="tamil"),
-    "telugu": ConversationEngine(language="telugu")
-}
 
 @csrf_exempt
 @require_http_methods(["GET", "POST"])
@@ -61,8 +78,12 @@ def webhook(request):
     elif request.method == "POST":
         # Handle incoming messages
         try:
-            body = json.loads(request.body)
-            logger.info(f"Received webhook: {json.dumps(body)}")
+            # The simulator hands over its payload already parsed
+            body = getattr(request, "parsed_body", None)
+            if body is None:
+                body = json.loads(request.body)
+            # Formatted only if debug logging is on, so the payload is not re-serialized on every POST
+            logger.debug("Received webhook: %s", body)
             
             # Verify this is a message notification
             if "entry" not in body:
@@ -84,28 +105,10 @@ def webhook(request):
                         continue
                         
                     for message in value["messages"]:
-                        sender = message["from"]
-                        message_type = message["type"]
-                        message_id = message["id"]
-                        timestamp = message.get("timestamp")
-                        
-                        # Mark the message as read
-                        whatsapp_client.mark_message_read(message_id)
-                        
-                        # Process different message types
-                        if message_type == "text":
-                            message_content = message["text"]["body"]
-                            process_text_message(sender, message_content, message_id, timestamp)
-                        elif message_type == "audio":
-                            # Get the media ID
-                            media_id = message["audio"]["id"]
-                            # Download the audio
-                            process_audio_message(sender, media_id, message_id, timestamp)
-                        else:
-                            # Skip other message types for now
-                            logger.info(f"Received unsupported message type: {message_type}")
+                        # Hand the message to a worker so the webhook is acknowledged right away
+                        run_task(process_inbound_message, message)
             
-            return JsonResponse({"status": "processing"})
+            return JsonResponse({"status": "queued"})
             
         except Exception as e:
             logger.error(f"Error processing webhook: {str(e)}")
@@ -125,120 +128,21 @@ def process_text_message(phone_number, message_content, message_id, timestamp=No
     try:
         logger.info(f"Processing text message from {phone_number}: {message_content[:50]}...")
         
+        # Detect the language on the pool while the customer is loaded
+        language = _io_pool.submit(get_language_processor().detect_language, message_content)
+        
         # Get or create customer
         customer = get_or_create_customer(phone_number)
         
-        # Detect language
-        detected_language = language_processor.detect_language(message_content)
-        
-        # Update customer's preferred language if needed
-        if customer.preferred_language != detected_language:
-            customer.preferred_language = detected_language
-            customer.save(update_fields=["preferred_language", "updated_at"])
-        
-        # Record the interaction
-        interaction = Interaction.objects.create(
-            customer=customer,
-            timestamp=timezone.now(),
-            direction="inbound",
-            message_type="text",
-            content=message_content,
-            whatsapp_message_id=message_id,
-            language=detected_language
-        )
-        
-        # Get conversation history
-        conversation_history = get_conversation_history(customer)
-        
-        # Translate to English if needed
-        english_text = message_content
-        if detected_language != "english":
-            english_text = language_processor.translate_to_english(message_content, detected_language)
+        detected_language = language.result()
         
-        # Get customer profile as dictionary
-        customer_profile = {
-            "id": customer.id,
-            "name": customer.name,
-            "phone_number": customer.phone_number,
-            "preferred_language": customer.preferred_language,
-            "property_details": customer.property_details,
-            "loan_requirements": customer.loan_requirements,
-            "conversation_state": customer.conversation_state,
-            "interest_level": customer.interest_level,
-            "do_not_contact": customer.do_not_contact
-        }
-        
-        # Get appropriate conversation engine
-        engine = conversation_engines.get(detected_language, conversation_engines["english"])
-        
-        # Generate response
-        response = engine.generate_response(english_text, customer_profile, conversation_history)
-        
-        # Update interaction with analysis
-        interaction.detected_intent = response["intent"]
-        interaction.conversation_state = response["state"]
-        interaction.ai_confidence = response["confidence"]
-        interaction.ai_analysis = response["analysis"]
-        interaction.save(update_fields=["detected_intent", "conversation_state", "ai_confidence", "ai_analysis"])
-        
-        # Update customer profile with extracted information
-        update_customer_profile(customer, response["extracted_info"], response["intent"], response["state"])
-        
-        # Translate response if needed
-        response_text = response["text"]
-        if detected_language != "english":
-            response_text = language_processor.translate_from_english(response["text"], detected_language)
-        
-        # Send text response
-        whatsapp_result = whatsapp_client.send_text(phone_number, response_text)
-
-        logger.info(f"whatsapp_result: {whatsapp_result}")
-        
-        # Record the outbound interaction
-        outbound_interaction = Interaction.objects.create(
-            customer=customer,
-            timestamp=timezone.now(),
-            direction="outbound",
-            message_type="text",
-            content=response_text,
-            language=detected_language,
-            whatsapp_message_id=whatsapp_result.get("messages", [{}])[0].get("id") if "messages" in whatsapp_result else None,
-            detected_intent=response["intent"],
-            conversation_state=response["state"],
-            ai_confidence=response["confidence"],
-            ai_analysis=response["analysis"]
-        )
-        
-        # Generate and send audio response if appropriate
-        if response.get("should_generate_audio", False):
-            audio_result = audio_processor.generate_audio_response(response_text, detected_language)
-            
-            if audio_result["success"]:
-                # Send audio message
-                whatsapp_client.send_audio(phone_number, audio_result["audio_path"])
-                
-                # Record the audio interaction
-                Interaction.objects.create(
-                    customer=customer,
-                    timestamp=timezone.now(),
-                    direction="outbound",
-                    message_type="audio",
-                    content=f"Audio version of: {response_text[:100]}...",
-                    media_url=audio_result["audio_path"],
-                    language=detected_language,
-                    detected_intent=response["intent"],
-                    conversation_state=response["state"]
-                )
-        
-        # Schedule follow-up if needed
-        if response.get("follow_up_date"):
-            schedule_followup(customer, response["follow_up_date"])
+        _respond_to_message(customer, message_content, detected_language, "text", None, message_id, always_audio=False)
         
         # Update any campaign targets
         update_campaign_targets(customer, "responded")
         
         logger.info(f"Successfully processed message from {phone_number}")
-    
+        
     except Exception as e:
         logger.error(f"Error processing text message: {str(e)}")
 
@@ -260,138 +164,177 @@ def process_audio_message(phone_number, media_id, message_id, timestamp=None):
         customer = get_or_create_customer(phone_number)
         
         # Download the audio
-        audio_content = whatsapp_client.download_media(media_id)
+        audio_content = get_client().download_media(media_id)
         
         if not audio_content:
             logger.error(f"Failed to download audio for {phone_number}")
             return
         
-        # Save audio to temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".ogg") as temp_file:
-            temp_file.write(audio_content)
-            audio_file = temp_file.name
-        
         # Process audio
-        audio_result = audio_processor.process_audio_message(audio_content)
+        audio_result = get_audio_processor().process_audio_message(audio_content)
         
         if not audio_result["success"]:
             logger.error(f"Failed to process audio: {audio_result.get('error')}")
-            os.unlink(audio_file)
             return
         
-        transcribed_text = audio_result["transcription"]
-        detected_language = audio_result["language"]
-        
-        # Update customer's preferred language if needed
-        if customer.preferred_language != detected_language:
-            customer.preferred_language = detected_language
-            customer.save(update_fields=["preferred_language", "updated_at"])
-        
-        # Record the interaction
-        interaction = Interaction.objects.create(
-            customer=customer,
-            timestamp=timezone.now(),
-            direction="inbound",
-            message_type="audio",
-            content=transcribed_text,
-            media_url=audio_result["storage_path"],
-            whatsapp_message_id=message_id,
-            language=detected_language
-        )
-        
         # Process the transcribed text like a regular text message
-        # Get conversation history
-        conversation_history = get_conversation_history(customer)
-        
-        # Translate to English if needed
-        english_text = transcribed_text
-        if detected_language != "english":
-            english_text = language_processor.translate_to_english(transcribed_text, detected_language)
-        
-        # Get customer profile as dictionary
-        customer_profile = {
-            "id": customer.id,
-            "name": customer.name,
-            "phone_number": customer.phone_number,
-            "preferred_language": customer.preferred_language,
-            "property_details": customer.property_details,
-            "loan_requirements": customer.loan_requirements,
-            "conversation_state": customer.conversation_state,
-            "interest_level": customer.interest_level,
-            "do_not_contact": customer.do_not_contact
-        }
-        
-        # Get appropriate conversation engine
-        engine = conversation_engines.get(detected_language, conversation_engines["english"])
-        
-        # Generate response
-        response = engine.generate_response(english_text, customer_profile, conversation_history)
-        
-        # Update interaction with analysis
-        interaction.detected_intent = response["intent"]
-        interaction.conversation_state = response["state"]
-        interaction.ai_confidence = response["confidence"]
-        interaction.ai_analysis = response["analysis"]
-        interaction.save(update_fields=["detected_intent", "conversation_state", "ai_confidence", "ai_analysis"])
-        
-        # Update customer profile with extracted information
-        update_customer_profile(customer, response["extracted_info"], response["intent"], response["state"])
-        
-        # Translate response if needed
-        response_text = response["text"]
-        if detected_language != "english":
-            response_text = language_processor.translate_from_english(response["text"], detected_language)
-        
-        # Send text response
-        whatsapp_result = whatsapp_client.send_text(phone_number, response_text)
-        
-        # Record the outbound interaction
-        outbound_interaction = Interaction.objects.create(
-            customer=customer,
-            timestamp=timezone.now(),
-            direction="outbound",
-            message_type="text",
-            content=response_text,
-            language=detected_language,
-            whatsapp_message_id=whatsapp_result.get("messages", [{}])[0].get("id") if "messages" in whatsapp_result else None,
-            detected_intent=response["intent"],
-            conversation_state=response["state"],
-            ai_confidence=response["confidence"],
-            ai_analysis=response["analysis"]
+        # For audio messages, we always respond with audio
+        _respond_to_message(
+            customer,
+            audio_result["transcription"],
+            audio_result["language"],
+            "audio",
+            audio_result["storage_path"],
+            message_id,
+            always_audio=True
         )
         
-        # Generate and send audio response
-        # For audio messages, we always respond with audio
-        audio_result = audio_processor.generate_audio_response(response_text, detected_language)
+        logger.info(f"Successfully processed audio message from {phone_number}")
         
-        if audio_result["success"]:
-            # Send audio message
-            whatsapp_client.send_audio(phone_number, audio_result["audio_path"])
-            
-            # Record the audio interaction
-            Interaction.objects.create(
-                customer=customer,
-                timestamp=timezone.now(),
-                direction="outbound",
-                message_type="audio",
-                content=f"Audio version of: {response_text[:100]}...",
-                media_url=audio_result["audio_path"],
-                language=detected_language,
-                detected_intent=response["intent"],
-                conversation_state=response["state"]
-            )
+    except Exception as e:
+        logger.error(f"Error processing audio message: {str(e)}")
+
+
+def _respond_to_message(customer, transcribed_text, detected_language, inbound_message_type,
+                        inbound_media_url, whatsapp_message_id, always_audio=False):
+    """
+    Reply to an inbound message and record both sides of the exchange
+    
+    Args:
+        customer: Customer who sent the message
+        transcribed_text: Message text, transcribed for audio messages
+        detected_language: Language of the message
+        inbound_message_type: "text" or "audio"
+        inbound_media_url: Storage path of the inbound media, if any
+        whatsapp_message_id: WhatsApp message ID of the inbound message
+        always_audio: Send an audio version of the reply even if the engine did not ask for one
+    """
+    dirty_fields = {"last_contacted"}
+    
+    # Update customer's preferred language if needed
+    if customer.preferred_language != detected_language:
+        customer.preferred_language = detected_language
+        dirty_fields.add("preferred_language")
+    
+    # Build the inbound interaction; it is saved with the reply below
+    interaction = Interaction(
+        customer=customer,
+        timestamp=timezone.now(),
+        direction="inbound",
+        message_type=inbound_message_type,
+        content=transcribed_text,
+        media_url=inbound_media_url,
+        whatsapp_message_id=whatsapp_message_id,
+        language=detected_language
+    )
+    
+    # Translate to English if needed, while the history is read on this thread's connection
+    translation = None
+    if detected_language != "english":
+        translation = _io_pool.submit(get_language_processor().translate_to_english, transcribed_text, detected_language)
+    
+    # Get only the history the engine reads, which ends with this message
+    conversation_history = get_conversation_history(customer, limit=ConversationEngine.HISTORY_EXCHANGES - 1)
+    conversation_history.append({
+        "timestamp": interaction.timestamp,
+        "direction": interaction.direction,
+        "content": interaction.content,
+        "message_type": interaction.message_type,
+        "language": interaction.language
+    })
+    
+    english_text = translation.result() if translation else transcribed_text
+    
+    # Get customer profile as dictionary
+    customer_profile = customer.to_profile_dict()
+    
+    # Use the prompts for the message's language, or the English ones if it is not supported
+    prompt_language = detected_language if detected_language in SUPPORTED_LANGUAGES else "english"
+    
+    # Generate response
+    response = get_conversation_engine().generate_response(english_text, customer_profile, conversation_history, language=prompt_language)
+    
+    # Add the analysis to the inbound interaction
+    interaction.detected_intent = response["intent"]
+    interaction.conversation_state = response["state"]
+    interaction.ai_confidence = response["confidence"]
+    interaction.ai_analysis = response["analysis"]
+    
+    # Update customer profile with extracted information
+    dirty_fields.update(update_customer_profile(customer, response["extracted_info"], response["intent"], response["state"]))
+    
+    # Translate response if needed
+    response_text = response["text"]
+    if detected_language != "english":
+        response_text = get_language_processor().translate_from_english(response["text"], detected_language)
+    
+    # Send text response
+    whatsapp_result = get_client().send_text(customer.phone_number, response_text)
+    
+    logger.info(f"whatsapp_result: {whatsapp_result}")
+    
+    # Record the inbound and outbound interactions together
+    outbound_interaction = Interaction(
+        customer=customer,
+        timestamp=timezone.now(),
+        direction="outbound",
+        message_type="text",
+        content=response_text,
+        language=detected_language,
+        whatsapp_message_id=whatsapp_result.message_id,
+        detected_intent=response["intent"],
+        conversation_state=response["state"],
+        ai_confidence=response["confidence"],
+        ai_analysis=response["analysis"]
+    )
+    
+    # Only the writes share a transaction, so no lock is held during the model and WhatsApp calls above
+    with transaction.atomic():
+        Interaction.objects.bulk_create([interaction, outbound_interaction])
+        
+        # Send an audio version in the background if appropriate
+        if always_audio or response.get("should_generate_audio", False):
+            _send_audio_reply(customer, response_text, detected_language, response)
         
         # Schedule follow-up if needed
         if response.get("follow_up_date"):
             schedule_followup(customer, response["follow_up_date"])
+            dirty_fields.add("next_contact_date")
         
-        # Clean up temporary file
-        os.unlink(audio_file)
-        
-        logger.info(f"Successfully processed audio message from {phone_number}")
+        # Write all customer changes from this message at once
+        customer.save(update_fields=[*dirty_fields, "updated_at"])
+
+
+def run_task(task, *args):
+    """
+    Queue a Celery task, or run it inline in simulation mode
     
-    except Exception as e:
-        logger.error(f"Error processing audio message: {str(e)}")
+    The simulator keeps its message log in this process, so its messages
+    have to be sent from here rather than from a worker.
+    
+    Args:
+        task: Celery task to run
+        *args: Arguments for the task
+    """
+    if is_simulation_mode():
+        task(*args)
+    else:
+        task.delay(*args)
+
+
+def _send_audio_reply(customer, response_text, language, response):
+    """
+    Queue the audio version of a reply once the message's changes are committed
+    
+    Args:
+        customer: Customer object
+        response_text: Text of the reply
+        language: Language of the reply
+        response: Response from the conversation engine
+    """
+    transaction.on_commit(lambda: run_task(
+        audio_reply, customer.id, response_text, language, response["intent"], response["state"]
+    ))
 
 
 def get_or_create_customer(phone_number):
@@ -404,16 +347,23 @@ def get_or_create_customer(phone_number):
     Returns:
         Customer object
     """
-    try:
-        customer = Customer.objects.get(phone_number=phone_number)
-        customer.last_contacted = timezone.now()
-        customer.save(update_fields=["last_contacted"])
-        return customer
-    except Customer.DoesNotExist:
-        return Customer.objects.create(
-            phone_number=phone_number,
-            last_contacted=timezone.now()
-        )
+    # Match on the normalized number so formatting differences resolve to one customer
+    phone_e164 = normalize_phone_number(phone_number)
+    if phone_e164 is not None:
+        lookup = {"phone_e164": phone_e164}
+    else:
+        lookup = {"phone_number": phone_number}
+    
+    # get_or_create retries the lookup if a concurrent delivery creates the customer first
+    now = timezone.now()
+    customer, created = Customer.objects.get_or_create(
+        **lookup,
+        defaults={"phone_number": phone_number, "last_contacted": now}
+    )
+    if not created:
+        # The caller saves last_contacted along with its other changes
+        customer.last_contacted = now
+    return customer
 
 
 def get_conversation_history(customer, limit=20):
@@ -422,35 +372,34 @@ def get_conversation_history(customer, limit=20):
     
     Args:
         customer: Customer object
-        limit: Maximum number of interactions to retrieve
+        limit: Maximum number of recent interactions to retrieve
         
     Returns:
-        List of interaction dictionaries
+        List of interaction dictionaries, oldest first
     """
-    interactions = Interaction.objects.filter(customer=customer).order_by('timestamp')[:limit]
-    
-    history = []
-    for interaction in interactions:
-        history.append({
-            "timestamp": interaction.timestamp,
-            "direction": interaction.direction,
-            "content": interaction.content,
-            "message_type": interaction.message_type,
-            "language": interaction.language
-        })
+    # Take the latest interactions from the (customer, -timestamp) index, then put them back in time order
+    history = list(
+        Interaction.objects.filter(customer=customer)
+        .order_by('-timestamp')
+        .values("timestamp", "direction", "content", "message_type", "language")[:limit]
+    )
+    history.reverse()
     
     return history
 
 
 def update_customer_profile(customer, extracted_info, intent, state):
     """
-    Update customer profile with extracted information
+    Update customer profile with extracted information without saving it
     
     Args:
         customer: Customer object
         extracted_info: Dictionary of extracted information
         intent: Detected intent
         state: New conversation state
+        
+    Returns:
+        Names of the fields that were set
     """
     # Update property details
     property_details = customer.property_details or {}
@@ -477,6 +426,7 @@ def update_customer_profile(customer, extracted_info, intent, state):
     customer.property_details = property_details
     customer.loan_requirements = loan_requirements
     customer.conversation_state = state
+    updated_fields = ["name", "property_details", "loan_requirements", "conversation_state", "interest_level"]
     
     # Update interest level based on intent and state
     if intent == "interested":
@@ -491,14 +441,14 @@ def update_customer_profile(customer, extracted_info, intent, state):
     # Update do_not_contact flag
     if "do_not_contact" in extracted_info and extracted_info["do_not_contact"]:
         customer.do_not_contact = True
+        updated_fields.append("do_not_contact")
     
-    # Save the updated customer
-    customer.save()
+    return updated_fields
 
 
 def schedule_followup(customer, time_frame):
     """
-    Schedule a follow-up based on time frame
+    Schedule a follow-up based on time frame; the caller saves next_contact_date
     
     Args:
         customer: Customer object
@@ -523,7 +473,6 @@ def schedule_followup(customer, time_frame):
     
     # Update customer's next contact date
     customer.next_contact_date = next_contact
-    customer.save(update_fields=["next_contact_date"])
     
     # Create a follow-up record
     FollowUp.objects.create(
@@ -543,18 +492,20 @@ def update_campaign_targets(customer, status):
         status: New status for campaign targets
     """
     # Update any pending campaign targets
-    targets = CampaignTarget.objects.filter(customer=customer, status="sent")
+    campaign_ids = list(
+        CampaignTarget.objects.filter(customer=customer, status="sent").values_list("campaign_id", flat=True)
+    )
+    if not campaign_ids:
+        return
     
-    for target in targets:
-        target.status = status
-        target.response_time = timezone.now()
-        target.save(update_fields=["status", "response_time"])
-        
-        # Update campaign statistics
-        campaign = target.campaign
-        if status == "responded":
-            campaign.total_responses += 1
-            campaign.save(update_fields=["total_responses"])
+    CampaignTarget.objects.filter(customer=customer, campaign_id__in=campaign_ids).update(
+        status=status,
+        response_time=timezone.now()
+    )
+    
+    # Update campaign statistics; a customer is targeted at most once per campaign
+    if status == "responded":
+        Campaign.objects.filter(id__in=campaign_ids).update(total_responses=F("total_responses") + 1)
 
 
 @csrf_exempt
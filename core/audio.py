@@ -1,7 +1,6 @@
 # core/audio.py
 
 import logging
-import tempfile
 import os
 from typing import Dict, Any, Optional
 import uuid
@@ -48,20 +47,12 @@ class AudioProcessor:
             if not filename:
                 filename = f"audio_{uuid.uuid4()}.ogg"
             
-            # Save audio to temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename)[1]) as temp_file:
-                temp_file.write(audio_content)
-                audio_path = temp_file.name
-            
-            # Process speech to text
-            speech_result = self.language_processor.speech_to_text(audio_path)
+            # Process speech to text straight from memory
+            speech_result = self.language_processor.speech_to_text(audio_content, filename=filename)
             
             # Save audio to storage
             storage_path = self._save_to_storage(audio_content, filename)
             
-            # Clean up temporary file
-            os.unlink(audio_path)
-            
             return {
                 "success": True,
                 "transcription": speech_result.get("text", ""),
@@ -96,25 +87,18 @@ class AudioProcessor:
         
         try:
             # Generate speech
-            audio_path = self.language_processor.text_to_speech(text, language)
+            audio_content = self.language_processor.text_to_speech(text, language)
             
-            if not audio_path:
+            if not audio_content:
                 return {
                     "success": False,
                     "error": "Failed to generate audio"
                 }
             
-            # Read the generated audio file
-            with open(audio_path, "rb") as audio_file:
-                audio_content = audio_file.read()
-            
             # Save to storage
             filename = f"response_{uuid.uuid4()}.mp3"
             storage_path = self._save_to_storage(audio_content, filename)
             
-            # Clean up temporary file
-            os.unlink(audio_path)
-            
             return {
                 "success": True,
                 "audio_path": storage_path,
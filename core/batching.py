@@ -0,0 +1,100 @@
+# core/batching.py
+
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger('core.batching')
+
+BATCH_INSTRUCTION = (
+    "Answer each of the numbered requests below independently. Respond with one JSON object "
+    "whose keys are the request numbers and whose values are the JSON answers to those requests.\n\n"
+)
+
+
+class PromptBatcher:
+    """
+    Packs JSON prompts sent at the same time from different threads into one model request
+    
+    Prompts are only combined within one process. A Celery prefork worker handles
+    one message at a time, so there it never forms a batch and the window is pure
+    added latency; batching only pays off in threaded servers such as gunicorn
+    with --threads.
+    """
+    
+    def __init__(self, complete: Callable[[str, int], Dict[str, Any]], window: float = 0.1, max_size: int = 8):
+        """
+        Initialize the batcher
+        
+        Args:
+            complete: Function taking a prompt and the number of requests in it,
+                returning the model's JSON answer as a dictionary
+            window: Seconds to wait for other prompts before sending a batch
+            max_size: Most prompts sent in one request
+        """
+        self.complete = complete
+        self.window = window
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._pending = []
+        self._full = threading.Event()
+    
+    def submit(self, prompt: str) -> Dict[str, Any]:
+        """
+        Get the model's answer to a prompt, possibly batched with others
+        
+        The first prompt of a batch waits up to the window for others, then
+        sends the batch and hands every caller its own answer.
+        
+        Args:
+            prompt: Prompt asking for a JSON answer
+        
+        Returns:
+            The answer as a dictionary
+        """
+        future = Future()
+        with self._lock:
+            self._pending.append((prompt, future))
+            leader = len(self._pending) == 1
+            if leader:
+                self._full.clear()
+            elif len(self._pending) >= self.max_size:
+                self._full.set()
+        
+        if leader:
+            self._full.wait(self.window)
+            with self._lock:
+                batch, self._pending = self._pending, []
+            for start in range(0, len(batch), self.max_size):
+                self._dispatch(batch[start:start + self.max_size])
+        
+        return future.result()
+    
+    def _dispatch(self, batch):
+        """Send one batch and resolve the futures of its prompts"""
+        if len(batch) == 1:
+            prompt, future = batch[0]
+            try:
+                future.set_result(self.complete(prompt, 1))
+            except Exception as e:
+                future.set_exception(e)
+            return
+        
+        numbered_prompt = BATCH_INSTRUCTION + "\n\n".join(
+            f"{number}: {prompt}" for number, (prompt, _) in enumerate(batch, 1)
+        )
+        try:
+            answers = self.complete(numbered_prompt, len(batch))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        
+        logger.info(f"Answered {len(batch)} prompts in one request")
+        for number, (_, future) in enumerate(batch, 1):
+            answer = answers.get(str(number))
+            if isinstance(answer, dict):
+                future.set_result(answer)
+            else:
+                future.set_exception(ValueError(f"No answer for request {number} in batch"))
@@ -1,17 +1,41 @@
 # Create a new file at core/client_factory.py
+import atexit
+import importlib.util
+from functools import lru_cache
+
+import httpx
+import openai
 from django.conf import settings
 from .utils import is_simulation_mode
 from .whatsapp import WhatsAppClient
-from simulator.simulator import WhatsAppSimulator
+from simulator.simulator import get_simulator
 
 def get_whatsapp_client():
     """Factory to get the appropriate WhatsApp client"""
     if is_simulation_mode():
-        return WhatsAppSimulator()
+        return get_simulator()
     else:
         return WhatsAppClient(
             api_key=settings.WHATSAPP_API_KEY,
             phone_number_id=settings.WHATSAPP_PHONE_NUMBER_ID,
             business_account_id=settings.WHATSAPP_BUSINESS_ACCOUNT_ID,
             version=getattr(settings, 'WHATSAPP_API_VERSION', 'v17.0')
-        )
\ No newline at end of file
+        )
+
+
+@lru_cache(maxsize=None)
+def get_openai_client():
+    """
+    Shared OpenAI client for the process
+    
+    Every engine and processor reuses one pooled HTTP client, so concurrent
+    conversations share keepalive connections instead of opening new ones.
+    HTTP/2 is used when the h2 package is installed.
+    """
+    http_client = httpx.Client(
+        http2=importlib.util.find_spec("h2") is not None,
+        timeout=httpx.Timeout(30.0, connect=5.0),
+        limits=httpx.Limits(max_connections=200, max_keepalive_connections=100),
+    )
+    atexit.register(http_client.close)
+    return openai.OpenAI(api_key=settings.OPENAI_API_KEY, http_client=http_client)
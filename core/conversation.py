@@ -1,18 +1,249 @@
 # core/conversation.py
 
-import json
+import hashlib
 import logging
 import os
+import re
+import threading
 import time
+from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, List, Any, Optional, Tuple
 
+import backoff
 import openai
+import orjson
 from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
 
+from .batching import PromptBatcher
+from .client_factory import get_openai_client
+from .intent_classifier import get_intent_classifier
+from .rate_limit import acquire_token
+
 logger = logging.getLogger('core.conversation')
 
+# Placeholders that prompt templates can contain
+_PROMPT_PLACEHOLDER = re.compile(r"\{(history|profile|message|current_profile)\}")
+
+
+@lru_cache(maxsize=256)
+def _compile_prompt(template: str) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """Split a prompt template into its literal text and the placeholder names between them"""
+    parts = _PROMPT_PLACEHOLDER.split(template)
+    return tuple(parts[0::2]), tuple(parts[1::2])
+
+
+def render_prompt(template: str, **values: str) -> str:
+    """
+    Fill a prompt template's placeholders in a single pass
+    
+    Args:
+        template: Prompt template with placeholders such as {history} or {message}
+        **values: Text for each placeholder; placeholders without a value are left as they are
+        
+    Returns:
+        The filled-in prompt
+    """
+    literals, names = _compile_prompt(template)
+    parts = [literals[0]]
+    for name, literal in zip(names, literals[1:]):
+        parts.append(values.get(name, f"{{{name}}}"))
+        parts.append(literal)
+    return "".join(parts)
+
+
+# Shared system prompt for every engine call. OpenAI caches identical prompt
+# prefixes of 1024 tokens or more, so this stays static and long enough to be
+# cached, and each call's own instructions go in the user message.
+SYSTEM_PROMPT = (
+    "You are the AI assistant behind a WhatsApp loan-against-property (LAP) service run by ABC Finance, "
+    "a reputable financial institution in India. Depending on the request, you analyze what a customer wants, "
+    "extract the details they share about their property and loan needs, or write the next message to them "
+    "as their loan advisor. Each request ends with its own task instructions; follow them exactly, along with "
+    "the guidelines below.\n\n"
+    
+    "## About the product\n"
+    "- A loan against property lets a customer borrow against a residential, commercial or plot property "
+    "they own, while they keep using the property.\n"
+    "- Customers can usually borrow 60-70% of the property's market value (the loan-to-value ratio). The exact "
+    "amount depends on the property type, its location, the valuation and the customer's repayment capacity.\n"
+    "- Interest rates start at 8.5% per year. The final rate depends on the customer's profile, income and "
+    "credit history, so never promise a specific rate.\n"
+    "- Tenure is flexible, up to 15 years. Longer tenures lower the EMI (equated monthly instalment) but "
+    "increase the total interest paid.\n"
+    "- Documentation is minimal: identity and address proof, income proof, and the property's title documents.\n"
+    "- The process has four steps: 1) complete the application form, 2) submit the property documents, "
+    "3) property valuation, 4) loan approval and disbursement. It typically takes 7-10 business days.\n"
+    "- Common purposes include business expansion, working capital, education, medical expenses, weddings, "
+    "home renovation and consolidating costlier debt.\n\n"
+    
+    "## Conduct\n"
+    "- Be friendly, professional and concise. WhatsApp messages should be short and easy to read on a phone; "
+    "avoid long paragraphs, tables and jargon.\n"
+    "- Never ask for Aadhaar, PAN, bank account, OTP, password or other identification or account numbers "
+    "in the chat. A loan officer collects documents through the official application.\n"
+    "- Never pressure the customer. If they say they are not interested, thank them, respect their decision "
+    "and do not try to change their mind.\n"
+    "- Acknowledge concerns respectfully and answer them with facts. Do not be defensive and do not criticize "
+    "other lenders.\n"
+    "- Do not guarantee approval, a loan amount, an interest rate or a timeline. Use words such as "
+    "\"typically\", \"approximately\" or \"starting at\".\n"
+    "- Do not give legal or tax advice; suggest that the customer consult a professional.\n"
+    "- Reply in the language the task asks for, or the customer's language when none is given. Keep amounts "
+    "in Indian units (lakh, crore) and the rupee sign when writing to customers.\n"
+    "- Use what the customer has already told you. Do not ask again for details that are in the customer "
+    "profile or the conversation history, and ask about the most important missing detail first.\n\n"
+    
+    "## Customer intents\n"
+    "When asked for the customer's intent, use exactly one of these names:\n"
+    "- interested: wants to go ahead or hear about the next step (\"yes\", \"sounds good\", \"how do I apply\").\n"
+    "- needs_more_info: open to it but wants general information before deciding.\n"
+    "- objection: raises a concern such as interest rates, fees, documentation, processing time, valuation "
+    "or the risk to the property.\n"
+    "- not_interested: declines or asks not to be contacted.\n"
+    "- asking_question: asks a specific question that should be answered before anything else.\n"
+    "- follow_up_later: is busy or wants to be contacted at another time.\n"
+    "Judge the intent from the latest message in the context of the conversation. A short \"ok\" after a "
+    "question about applying means interested; \"not now\" means follow_up_later unless the customer "
+    "rejects the offer outright.\n\n"
+    
+    "## Customer details\n"
+    "When asked to extract information, report only what the customer's message states or clearly implies, "
+    "and null for everything else. Do not repeat already known information unless the customer has changed "
+    "or corrected it.\n"
+    "- property_type: such as residential flat, independent house, commercial shop, office, plot or land.\n"
+    "- property_location: city, locality or area of the property.\n"
+    "- property_value: approximate market value in rupees, as a number.\n"
+    "- loan_amount_needed: amount the customer wants to borrow in rupees, as a number.\n"
+    "- loan_purpose: what the money is for.\n"
+    "- current_loans: existing loans or EMIs the customer mentions.\n"
+    "- monthly_income: monthly income in rupees, as a number. Convert annual figures to monthly.\n"
+    "- ownership_status: such as sole owner, joint owner, inherited or family-owned.\n"
+    "- urgency: how soon the customer needs the money.\n"
+    "- concerns: worries or objections the customer raises, as a list.\n"
+    "Convert amounts to plain rupees: 1 lakh (lac, L) is 100,000 and 1 crore (cr) is 10,000,000, so "
+    "\"80 lakhs\" is 8000000, \"1.5 crore\" is 15000000 and \"50k\" is 50000.\n\n"
+    
+    "## Common concerns\n"
+    "- Interest rates: loans against property are secured, so rates are usually lower than personal loans "
+    "or credit cards.\n"
+    "- Risk to the property: the customer keeps ownership and use of the property; it is only at risk if "
+    "the loan is not repaid, so suggest an EMI that fits their monthly budget comfortably.\n"
+    "- Processing time: typically 7-10 business days, mostly spent on document checks and valuation.\n"
+    "- Documentation: the list is short, and a loan officer helps the customer gather it.\n"
+    "- Valuation: an independent valuer assesses the property at no extra effort for the customer.\n\n"
+    
+    "## Writing replies\n"
+    "- Keep replies to two to four short sentences unless the task says otherwise.\n"
+    "- Respond to what the customer just said before moving the conversation forward.\n"
+    "- End with one clear question or next step, not several.\n"
+    "- Do not start with greetings again in the middle of a conversation, and do not sign off with a name.\n"
+    "- Do not use markdown headings; WhatsApp shows them as plain symbols. Use simple line breaks instead.\n"
+    "- When the customer is ready to apply, offer to connect them with a loan officer who will guide them "
+    "through the application.\n"
+    "- When writing a follow-up, reference specific details from the earlier conversation, check whether the "
+    "customer is ready to proceed or needs more information, and stay polite and not pushy."
+)
+
+# Asks for the intent and the extracted details in one model call
+COMBINED_ANALYSIS_PROMPT = (
+    "You are an assistant analyzing a customer conversation about loan-against-property.\n\n"
+    "Conversation history:\n{history}\n\n"
+    "Customer's message: {message}\n\n"
+    "Current known information: {current_profile}\n\n"
+    "Return a JSON object with two fields:\n"
+    "- \"intent\": the customer's primary intent, exactly one of: interested, needs_more_info, "
+    "objection, not_interested, asking_question, follow_up_later\n"
+    "- \"extracted\": an object with any of these fields the message gives: property_type, "
+    "property_location, property_value, loan_amount_needed, loan_purpose, current_loans, monthly_income, "
+    "ownership_status, urgency, concerns. Do not include already known information unless the customer "
+    "has changed or corrected it."
+)
+
+# Fields the model may extract from a message, null when the message does not give them.
+# Amounts are numbers in rupees, so answers need no currency parsing.
+_NULLABLE_STRING = {"type": ["string", "null"]}
+_NULLABLE_NUMBER = {"type": ["number", "null"]}
+EXTRACTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "property_type": _NULLABLE_STRING,
+        "property_location": _NULLABLE_STRING,
+        "property_value": _NULLABLE_NUMBER,
+        "loan_amount_needed": _NULLABLE_NUMBER,
+        "loan_purpose": _NULLABLE_STRING,
+        "current_loans": _NULLABLE_STRING,
+        "monthly_income": _NULLABLE_NUMBER,
+        "ownership_status": _NULLABLE_STRING,
+        "urgency": _NULLABLE_STRING,
+        "concerns": {"type": ["array", "null"], "items": {"type": "string"}},
+    },
+    "additionalProperties": False,
+}
+EXTRACTION_SCHEMA["required"] = list(EXTRACTION_SCHEMA["properties"])
+
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "intent": {
+            "type": "string",
+            "enum": ["interested", "needs_more_info", "objection", "not_interested", "asking_question", "follow_up_later"],
+        },
+        "extracted": EXTRACTION_SCHEMA,
+    },
+    "required": ["intent", "extracted"],
+    "additionalProperties": False,
+}
+
+
+def _json_schema_format(name: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Structured output response format holding the model to a JSON schema"""
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+@lru_cache(maxsize=None)
+def _extraction_response_format(requests: int) -> Dict[str, Any]:
+    """Response format for one extraction answer, or for a batch of them keyed by request number"""
+    if requests == 1:
+        return _json_schema_format("extracted_information", EXTRACTION_SCHEMA)
+    
+    numbers = [str(number) for number in range(1, requests + 1)]
+    return _json_schema_format("extracted_information_batch", {
+        "type": "object",
+        "properties": {number: EXTRACTION_SCHEMA for number in numbers},
+        "required": numbers,
+        "additionalProperties": False,
+    })
+
+
+# Short replies such as "yes" or "call me later" are cached by state and text,
+# so repeated ones skip the intent detection call
+INTENT_CACHE_MAX_LENGTH = 40
+INTENT_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Classifier answers below this probability are left to the chat model
+INTENT_CLASSIFIER_MIN_CONFIDENCE = 0.6
+
+# Model calls share a per-minute budget with every worker through Redis,
+# and each process caps how many are in flight at once
+OPENAI_RATE_KEY = "openai:requests"
+_openai_slots = threading.BoundedSemaphore(settings.OPENAI_MAX_CONCURRENT_REQUESTS)
+
+
+@dataclass(slots=True)
+class FollowupContext:
+    """Customer details a follow-up message is generated from"""
+    customer_name: str = "there"
+    last_state: str = "initial"
+    follow_up_reason: Optional[str] = None
+    days_since_contact: int = 0
+    property_details: Dict[str, Any] = field(default_factory=dict)
+    loan_requirements: Dict[str, Any] = field(default_factory=dict)
+
+
 class ConversationEngine:
     """Core conversation engine for the WhatsApp Loan-Against-Property Agent"""
     
@@ -38,90 +269,169 @@ class ConversationEngine:
         ASKING_QUESTION = "asking_question"
         FOLLOW_UP_LATER = "follow_up_later"
     
+    # Phrases that settle the intent of a short message without asking the model
+    INTENT_PATTERNS = {
+        Intent.NOT_INTERESTED: re.compile(
+            r"\b(not|no longer|never)\s+(at all\s+|\w+\s+)?interested\b|\bno thanks?\b|\bstop\b|\bunsubscribe\b"
+            r"|\bdon['’]?t (want|call|message|contact)\b|\bremove me\b"
+        ),
+        Intent.FOLLOW_UP_LATER: re.compile(
+            r"\blater\b|\bnext (week|month)\b|\bbusy\b|\btomorrow\b|\bsome other time\b"
+        ),
+        Intent.INTERESTED: re.compile(
+            r"^(yes|yeah|yep|ok|okay|sure)\b|\binterested\b|\bproceed\b|\bgo ahead\b"
+        ),
+    }
+    # A negated message is never taken as interest without asking the model; phone keyboards often type ’
+    NEGATION_PATTERN = re.compile(r"\b(not|no|never|dont|wont|cant)\b|\b\w+n['’]t\b")
+    
+    # Longest message, in words, that the patterns are trusted on
+    INTENT_PATTERN_MAX_WORDS = 8
+    
+    # Loan terms that make a loan details reply worth sending as audio too
+    AUDIO_LOAN_TERMS = re.compile(r"interest rate|emi|tenure|processing fee", re.IGNORECASE)
+    
+    # Most recent exchanges included in prompts
+    HISTORY_EXCHANGES = 10
+    
+    # Amounts or property and loan terms; short messages without them have nothing to extract
+    INFORMATION_PATTERN = re.compile(
+        r"\d|₹|%|\b(lakhs?|lacs?|crores?|cr|rs|inr|emi|tenure|own|owns|property|loan|income|salary|month|monthly"
+        r"|house|flat|plot|land|shop|apartment)\b",
+        re.IGNORECASE
+    )
+    INFORMATION_MIN_WORDS = 4
+    
+    # Next state for each intent, by current state; intents not listed keep the state
+    STATE_TRANSITIONS = {
+        State.INITIAL: {
+            Intent.INTERESTED: State.INTRODUCTION,
+            Intent.NEEDS_MORE_INFO: State.INTRODUCTION,
+            Intent.NOT_INTERESTED: State.NOT_INTERESTED,
+            Intent.ASKING_QUESTION: State.INTRODUCTION,
+        },
+        State.INTRODUCTION: {
+            Intent.INTERESTED: State.QUALIFYING,
+            Intent.NEEDS_MORE_INFO: State.QUALIFYING,
+            Intent.OBJECTION: State.OBJECTION_HANDLING,
+            Intent.NOT_INTERESTED: State.NOT_INTERESTED,
+            Intent.ASKING_QUESTION: State.QUALIFYING,
+        },
+        State.QUALIFYING: {
+            Intent.INTERESTED: State.PROPERTY_DETAILS,
+            Intent.NEEDS_MORE_INFO: State.QUALIFYING,
+            Intent.OBJECTION: State.OBJECTION_HANDLING,
+            Intent.NOT_INTERESTED: State.NOT_INTERESTED,
+            Intent.ASKING_QUESTION: State.QUALIFYING,
+            Intent.FOLLOW_UP_LATER: State.FOLLOW_UP_SCHEDULING,
+        },
+        State.PROPERTY_DETAILS: {
+            Intent.INTERESTED: State.LOAN_DETAILS,
+            Intent.NEEDS_MORE_INFO: State.PROPERTY_DETAILS,
+            Intent.OBJECTION: State.OBJECTION_HANDLING,
+            Intent.NOT_INTERESTED: State.NOT_INTERESTED,
+            Intent.ASKING_QUESTION: State.PROPERTY_DETAILS,
+            Intent.FOLLOW_UP_LATER: State.FOLLOW_UP_SCHEDULING,
+        },
+        State.LOAN_DETAILS: {
+            Intent.INTERESTED: State.CLOSING,
+            Intent.NEEDS_MORE_INFO: State.LOAN_DETAILS,
+            Intent.OBJECTION: State.OBJECTION_HANDLING,
+            Intent.NOT_INTERESTED: State.NOT_INTERESTED,
+            Intent.ASKING_QUESTION: State.LOAN_DETAILS,
+            Intent.FOLLOW_UP_LATER: State.FOLLOW_UP_SCHEDULING,
+        },
+        State.OBJECTION_HANDLING: {
+            Intent.INTERESTED: State.LOAN_DETAILS,
+            Intent.NEEDS_MORE_INFO: State.LOAN_DETAILS,
+            Intent.OBJECTION: State.OBJECTION_HANDLING,
+            Intent.NOT_INTERESTED: State.NOT_INTERESTED,
+            Intent.ASKING_QUESTION: State.LOAN_DETAILS,
+            Intent.FOLLOW_UP_LATER: State.FOLLOW_UP_SCHEDULING,
+        },
+        State.CLOSING: {
+            Intent.INTERESTED: State.COMPLETED,
+            Intent.NEEDS_MORE_INFO: State.LOAN_DETAILS,
+            Intent.OBJECTION: State.OBJECTION_HANDLING,
+            Intent.NOT_INTERESTED: State.NOT_INTERESTED,
+            Intent.ASKING_QUESTION: State.LOAN_DETAILS,
+            Intent.FOLLOW_UP_LATER: State.FOLLOW_UP_SCHEDULING,
+        },
+        State.FOLLOW_UP_SCHEDULING: {
+            Intent.INTERESTED: State.LOAN_DETAILS,
+            Intent.NEEDS_MORE_INFO: State.LOAN_DETAILS,
+            Intent.NOT_INTERESTED: State.NOT_INTERESTED,
+            # Default is to stay in follow-up scheduling
+        },
+        # Terminal states
+        State.COMPLETED: {},
+        State.NOT_INTERESTED: {
+            Intent.INTERESTED: State.INTRODUCTION,  # If they change their mind
+        },
+    }
+    
+    # The same transitions keyed by (state, intent), so a turn needs one lookup
+    _TRANSITIONS = {
+        (state, intent): next_state
+        for state, transitions in STATE_TRANSITIONS.items()
+        for intent, next_state in transitions.items()
+    }
+    
     def __init__(self, language="english"):
         """
         Initialize the conversation engine
         
         Args:
-            language: Language to use for conversation
+            language: Default language for calls that do not pass one
         """
         self.language = language
-        self.openai_client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
-        self.model = settings.DEFAULT_AI_MODEL
+        self.openai_client = get_openai_client()
+        # Intents and extraction are narrow tasks for a small model; replies use the main one
+        self.intent_model = settings.INTENT_AI_MODEL
+        self.extract_model = settings.EXTRACT_AI_MODEL
+        self.generation_model = settings.GENERATION_AI_MODEL
         self.max_conversation_tokens = 4000  # Limit history size
-        self.load_prompts()
-        
-        # Setup state transition map
-        self.state_transitions = {
-            self.State.INITIAL: {
-                self.Intent.INTERESTED: self.State.INTRODUCTION,
-                self.Intent.NEEDS_MORE_INFO: self.State.INTRODUCTION,
-                self.Intent.NOT_INTERESTED: self.State.NOT_INTERESTED,
-                self.Intent.ASKING_QUESTION: self.State.INTRODUCTION,
-            },
-            self.State.INTRODUCTION: {
-                self.Intent.INTERESTED: self.State.QUALIFYING,
-                self.Intent.NEEDS_MORE_INFO: self.State.QUALIFYING,
-                self.Intent.OBJECTION: self.State.OBJECTION_HANDLING,
-                self.Intent.NOT_INTERESTED: self.State.NOT_INTERESTED,
-                self.Intent.ASKING_QUESTION: self.State.QUALIFYING,
-            },
-            self.State.QUALIFYING: {
-                self.Intent.INTERESTED: self.State.PROPERTY_DETAILS,
-                self.Intent.NEEDS_MORE_INFO: self.State.QUALIFYING,
-                self.Intent.OBJECTION: self.State.OBJECTION_HANDLING,
-                self.Intent.NOT_INTERESTED: self.State.NOT_INTERESTED,
-                self.Intent.ASKING_QUESTION: self.State.QUALIFYING,
-                self.Intent.FOLLOW_UP_LATER: self.State.FOLLOW_UP_SCHEDULING,
-            },
-            self.State.PROPERTY_DETAILS: {
-                self.Intent.INTERESTED: self.State.LOAN_DETAILS,
-                self.Intent.NEEDS_MORE_INFO: self.State.PROPERTY_DETAILS,
-                self.Intent.OBJECTION: self.State.OBJECTION_HANDLING,
-                self.Intent.NOT_INTERESTED: self.State.NOT_INTERESTED,
-                self.Intent.ASKING_QUESTION: self.State.PROPERTY_DETAILS,
-                self.Intent.FOLLOW_UP_LATER: self.State.FOLLOW_UP_SCHEDULING,
-            },
-            self.State.LOAN_DETAILS: {
-                self.Intent.INTERESTED: self.State.CLOSING,
-                self.Intent.NEEDS_MORE_INFO: self.State.LOAN_DETAILS,
-                self.Intent.OBJECTION: self.State.OBJECTION_HANDLING,
-                self.Intent.NOT_INTERESTED: self.State.NOT_INTERESTED,
-                self.Intent.ASKING_QUESTION: self.State.LOAN_DETAILS,
-                self.Intent.FOLLOW_UP_LATER: self.State.FOLLOW_UP_SCHEDULING,
-            },
-            self.State.OBJECTION_HANDLING: {
-                self.Intent.INTERESTED: self.State.LOAN_DETAILS,
-                self.Intent.NEEDS_MORE_INFO: self.State.LOAN_DETAILS,
-                self.Intent.OBJECTION: self.State.OBJECTION_HANDLING,
-                self.Intent.NOT_INTERESTED: self.State.NOT_INTERESTED,
-                self.Intent.ASKING_QUESTION: self.State.LOAN_DETAILS,
-                self.Intent.FOLLOW_UP_LATER: self.State.FOLLOW_UP_SCHEDULING,
-            },
-            self.State.CLOSING: {
-                self.Intent.INTERESTED: self.State.COMPLETED,
-                self.Intent.NEEDS_MORE_INFO: self.State.LOAN_DETAILS,
-                self.Intent.OBJECTION: self.State.OBJECTION_HANDLING,
-                self.Intent.NOT_INTERESTED: self.State.NOT_INTERESTED,
-                self.Intent.ASKING_QUESTION: self.State.LOAN_DETAILS,
-                self.Intent.FOLLOW_UP_LATER: self.State.FOLLOW_UP_SCHEDULING,
-            },
-            self.State.FOLLOW_UP_SCHEDULING: {
-                self.Intent.INTERESTED: self.State.LOAN_DETAILS,
-                self.Intent.NEEDS_MORE_INFO: self.State.LOAN_DETAILS,
-                self.Intent.NOT_INTERESTED: self.State.NOT_INTERESTED,
-                # Default is to stay in follow-up scheduling
-            },
-            # Terminal states
-            self.State.COMPLETED: {},
-            self.State.NOT_INTERESTED: {
-                self.Intent.INTERESTED: self.State.INTRODUCTION,  # If they change their mind
-            },
-        }
+        self.intent_classifier = get_intent_classifier()
+        # Extraction prompts from concurrent conversations can share a request
+        self._extraction_batcher = None
+        if settings.OPENAI_BATCH_WINDOW_MS:
+            self._extraction_batcher = PromptBatcher(
+                self._extract_json, settings.OPENAI_BATCH_WINDOW_MS / 1000, settings.OPENAI_BATCH_SIZE
+            )
+    
+    @backoff.on_exception(backoff.expo,
+                          openai.RateLimitError,
+                          max_tries=5,
+                          max_value=60)
+    def _chat_completion(self, **kwargs):
+        """
+        Create a chat completion within the shared OpenAI rate limits
+        
+        Args:
+            **kwargs: Arguments for chat.completions.create
+            
+        Returns:
+            The completion response
+        """
+        acquire_token(OPENAI_RATE_KEY, max(1, settings.OPENAI_REQUESTS_PER_MINUTE // 60))
+        with _openai_slots:
+            return self.openai_client.chat.completions.create(**kwargs)
     
-    def load_prompts(self):
-        """Load conversation prompts for the current language"""
-        prompt_dir = Path(settings.BASE_DIR) / 'prompts' / self.language
+    def get_prompts(self, language: str = None) -> Dict[str, str]:
+        """
+        Get the conversation prompts for a language
+        
+        Args:
+            language: Language of the prompts (defaults to instance language)
+            
+        Returns:
+            Dictionary of prompt templates by name
+        """
+        return self.load_prompts(language or self.language)
+    
+    def load_prompts(self, language: str) -> Dict[str, str]:
+        """Load conversation prompts for a language, reading the file again only after it changes"""
+        prompt_dir = Path(settings.BASE_DIR) / 'prompts' / language
         
         # Create prompt directory if it doesn't exist
         if not prompt_dir.exists():
@@ -131,6 +441,8 @@ class ConversationEngine:
             default_prompts = {
                 "intent_detection": "You are an assistant analyzing a customer conversation about loan-against-property. Based on the conversation history and the customer's latest message, determine their primary intent from these categories: interested, needs_more_info, objection, not_interested, asking_question, follow_up_later.\n\nConversation history:\n{history}\n\nCustomer's message: {message}\n\nIdentify the customer's intent as exactly one of: interested, needs_more_info, objection, not_interested, asking_question, follow_up_later. Respond with only that category name.",
                 
+                "combined_analysis": COMBINED_ANALYSIS_PROMPT,
+                
                 "information_extraction": "Extract key information from the customer message about their property and loan requirements. Return the information as a JSON object with any of these fields if present: property_type, property_location, property_value, loan_amount_needed, loan_purpose, current_loans, monthly_income, ownership_status, urgency, concerns.\n\nCustomer message: {message}\n\nCurrent known information: {current_profile}\n\nReturn only a JSON object with the newly extracted information. Do not include already known information unless the customer has changed or corrected it.",
                 
                 "initial": "You are a professional loan advisor for a reputable financial institution. You're reaching out to introduce loan-against-property options. Be friendly but professional. Briefly introduce yourself and mention that your company offers competitive loan-against-property services. Ask if they own property and if they've considered using it to secure financing. Keep your response concise, under 3 sentences.\n\nCustomer profile: {profile}\n\nRespond in a conversational, professional tone.",
@@ -153,69 +465,82 @@ class ConversationEngine:
             }
             
             # Save default prompts
-            with open(prompt_dir / 'prompts.json', 'w') as f:
-                json.dump(default_prompts, f, indent=4)
+            with open(prompt_dir / 'prompts.json', 'wb') as f:
+                f.write(orjson.dumps(default_prompts, option=orjson.OPT_INDENT_2))
         
         # Load prompts from file
+        prompt_file = prompt_dir / 'prompts.json'
         try:
-            with open(prompt_dir / 'prompts.json', 'r') as f:
-                self.prompts = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError) as e:
+            return self._read_prompts(prompt_file, prompt_file.stat().st_mtime)
+        except (FileNotFoundError, orjson.JSONDecodeError) as e:
             logger.error(f"Failed to load prompts: {str(e)}")
             # Fall back to empty dict, which will cause default prompts to be used
-            self.prompts = {}
+            return {}
+    
+    @staticmethod
+    @lru_cache(maxsize=16)
+    def _read_prompts(prompt_file: Path, mtime: float) -> Dict[str, str]:
+        """
+        Parse a prompts file, shared by every engine until the file is modified
+        
+        Args:
+            prompt_file: Path of the prompts.json file
+            mtime: Modification time of the file, so edits are picked up
+            
+        Returns:
+            Dictionary of prompt templates by name
+        """
+        with open(prompt_file, 'rb') as f:
+            prompts = orjson.loads(f.read())
+        
+        # Split the templates now rather than on the first message that uses them
+        for template in prompts.values():
+            if isinstance(template, str):
+                _compile_prompt(template)
+        return prompts
     
-    def detect_intent(self, message: str, conversation_history: List[Dict[str, Any]]) -> Tuple[str, float]:
+    def detect_intent(self, message: str, conversation_history: List[Dict[str, Any]], language: str = None) -> Tuple[str, float]:
         """
         Detect customer intent from message
         
         Args:
             message: Customer's message
             conversation_history: List of previous exchanges
+            language: Language of the prompts to use (defaults to instance language)
             
         Returns:
             Tuple of (intent, confidence_score)
         """
+        # Short messages that match exactly one intent's phrases need no model call
+        keyword_intent = self._match_intent_keywords(message)
+        if keyword_intent:
+            logger.info(f"Detected intent: {keyword_intent} from keywords")
+            return keyword_intent, 0.9
+        
+        classified_intent = self._classify_intent(message)
+        if classified_intent:
+            logger.info(f"Detected intent: {classified_intent[0]} from classifier with confidence: {classified_intent[1]}")
+            return classified_intent
+        
         # Format conversation history
         history_text = self._format_conversation_history(conversation_history)
         
         # Use intent detection prompt
-        prompt = self.prompts.get("intent_detection", "Determine the intent of this message: {message}")
-        prompt = prompt.replace("{history}", history_text).replace("{message}", message)
+        prompt = self.get_prompts(language).get("intent_detection", "Determine the intent of this message: {message}")
+        prompt = render_prompt(prompt, history=history_text, message=message)
         
         try:
-            response = self.openai_client.chat.completions.create(
-                model=self.model,
+            response = self._chat_completion(
+                model=self.intent_model,
                 messages=[
-                    {"role": "system", "content": "You analyze customer intent in conversations."},
+                    {"role": "system", "content": SYSTEM_PROMPT},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.3,  # Lower temperature for more consistent results
-                max_tokens=50  # Intent detection should be short
+                max_tokens=10  # Only the intent name is needed
             )
             
-            intent = response.choices[0].message.content.strip().lower()
-            
-            # Normalize intent to match our intent classes
-            if intent in [self.Intent.INTERESTED, self.Intent.NEEDS_MORE_INFO, 
-                         self.Intent.OBJECTION, self.Intent.NOT_INTERESTED,
-                         self.Intent.ASKING_QUESTION, self.Intent.FOLLOW_UP_LATER]:
-                normalized_intent = intent
-            elif "interest" in intent:
-                normalized_intent = self.Intent.INTERESTED
-            elif "more info" in intent or "information" in intent:
-                normalized_intent = self.Intent.NEEDS_MORE_INFO
-            elif "object" in intent or "concern" in intent:
-                normalized_intent = self.Intent.OBJECTION
-            elif "not" in intent and ("interest" in intent or "want" in intent):
-                normalized_intent = self.Intent.NOT_INTERESTED
-            elif "question" in intent or "ask" in intent:
-                normalized_intent = self.Intent.ASKING_QUESTION
-            elif "follow" in intent or "later" in intent:
-                normalized_intent = self.Intent.FOLLOW_UP_LATER
-            else:
-                # Default to needing more info if we can't classify
-                normalized_intent = self.Intent.NEEDS_MORE_INFO
+            normalized_intent = self._normalize_intent(response.choices[0].message.content)
             
             # Calculate confidence based on model's completion (simple approach)
             confidence = 0.7  # Base confidence
@@ -230,64 +555,249 @@ class ConversationEngine:
             # Return default intent with low confidence
             return self.Intent.NEEDS_MORE_INFO, 0.5
     
-    def extract_information(self, message: str, current_profile: Dict[str, Any]) -> Dict[str, Any]:
+    def _normalize_intent(self, intent: str) -> str:
+        """
+        Map the model's answer onto one of the intent classes
+        
+        Args:
+            intent: Intent text returned by the model
+            
+        Returns:
+            Intent class name
+        """
+        intent = (intent or "").strip().lower()
+        
+        if intent in [self.Intent.INTERESTED, self.Intent.NEEDS_MORE_INFO, 
+                     self.Intent.OBJECTION, self.Intent.NOT_INTERESTED,
+                     self.Intent.ASKING_QUESTION, self.Intent.FOLLOW_UP_LATER]:
+            return intent
+        elif "interest" in intent:
+            return self.Intent.INTERESTED
+        elif "more info" in intent or "information" in intent:
+            return self.Intent.NEEDS_MORE_INFO
+        elif "object" in intent or "concern" in intent:
+            return self.Intent.OBJECTION
+        elif "not" in intent and ("interest" in intent or "want" in intent):
+            return self.Intent.NOT_INTERESTED
+        elif "question" in intent or "ask" in intent:
+            return self.Intent.ASKING_QUESTION
+        elif "follow" in intent or "later" in intent:
+            return self.Intent.FOLLOW_UP_LATER
+        else:
+            # Default to needing more info if we can't classify
+            return self.Intent.NEEDS_MORE_INFO
+    
+    def _match_intent_keywords(self, message: str) -> Optional[str]:
+        """
+        Match a short message against the intent phrases
+        
+        Args:
+            message: Customer's message
+            
+        Returns:
+            The intent if exactly one intent's phrases match, otherwise None
+        """
+        normalized = " ".join(message.lower().split())
+        if not normalized or len(normalized.split(" ")) > self.INTENT_PATTERN_MAX_WORDS:
+            return None
+        
+        negated = self.NEGATION_PATTERN.search(normalized)
+        matches = [
+            intent for intent, pattern in self.INTENT_PATTERNS.items()
+            if pattern.search(normalized) and not (negated and intent == self.Intent.INTERESTED)
+        ]
+        return matches[0] if len(matches) == 1 else None
+    
+    def _may_contain_information(self, message: str) -> bool:
+        """Whether a message could hold profile details, so that extraction is worth a model call"""
+        return len(message.split()) >= self.INFORMATION_MIN_WORDS or bool(self.INFORMATION_PATTERN.search(message))
+    
+    def _intent_cache_key(self, message: str, current_state: str, language: str = None) -> Optional[str]:
+        """Cache key for the intent of a short message in a state, or None if the message is too long to cache"""
+        normalized = " ".join(message.lower().split())
+        if len(normalized) > INTENT_CACHE_MAX_LENGTH:
+            return None
+        
+        key_source = f"{self.extract_model}:{language or self.language}:{current_state}:{normalized}"
+        return f"intent:{hashlib.sha256(key_source.encode()).hexdigest()}"
+    
+    def _known_intent(self, message: str, current_state: str, language: str = None) -> Optional[Tuple[str, float]]:
+        """
+        Get the intent of a message without a chat model call, from keywords, the cache or the classifier
+        
+        Args:
+            message: Customer's message
+            current_state: Conversation state the message was received in
+            language: Language of the prompts to use (defaults to instance language)
+            
+        Returns:
+            Tuple of (intent, confidence_score), or None if the model has to be asked
+        """
+        keyword_intent = self._match_intent_keywords(message)
+        if keyword_intent:
+            return keyword_intent, 0.9
+        
+        cache_key = self._intent_cache_key(message, current_state, language)
+        cached_intent = cache.get(cache_key) if cache_key else None
+        return cached_intent or self._classify_intent(message)
+    
+    def _classify_intent(self, message: str) -> Optional[Tuple[str, float]]:
+        """
+        Classify a message with the intent classifier, if one is configured
+        
+        Args:
+            message: Customer's message
+            
+        Returns:
+            Tuple of (intent, confidence_score), or None if the model has to be asked
+        """
+        if not self.intent_classifier:
+            return None
+        
+        try:
+            intent, confidence = self.intent_classifier.classify(message)
+        except Exception as e:
+            logger.error(f"Error classifying intent: {str(e)}")
+            return None
+        
+        if confidence < INTENT_CLASSIFIER_MIN_CONFIDENCE:
+            return None
+        return self._normalize_intent(intent), confidence
+    
+    def _remember_intent(self, message: str, current_state: str, language: str, intent: str, confidence: float):
+        """Cache the intent the model gave for a short message"""
+        cache_key = self._intent_cache_key(message, current_state, language)
+        
+        # The fallback after an API error is not worth keeping
+        if cache_key and confidence > 0.5:
+            cache.set(cache_key, (intent, confidence), INTENT_CACHE_TIMEOUT)
+    
+    def extract_information(self, message: str, current_profile: Dict[str, Any], language: str = None,
+                            profile_text: str = None) -> Dict[str, Any]:
         """
         Extract key information from customer message
         
         Args:
             message: Customer's message
             current_profile: Current customer profile information
+            language: Language of the prompts to use (defaults to instance language)
+            profile_text: Profile already serialized for a prompt, if the caller has it
             
         Returns:
             Dictionary with extracted information
         """
+        if profile_text is None:
+            profile_text = orjson.dumps(current_profile).decode()
+        
         # Use information extraction prompt
-        prompt = self.prompts.get("information_extraction", "Extract information from this message: {message}")
-        prompt = prompt.replace("{message}", message).replace("{current_profile}", json.dumps(current_profile))
+        prompt = self.get_prompts(language).get("information_extraction", "Extract information from this message: {message}")
+        prompt = render_prompt(prompt, message=message, current_profile=profile_text)
         
         try:
-            response = self.openai_client.chat.completions.create(
-                model=self.model,
+            if self._extraction_batcher:
+                extracted_info = self._extraction_batcher.submit(prompt)
+            else:
+                extracted_info = self._extract_json(prompt)
+            return self._clean_extracted_info(extracted_info)
+            
+        except orjson.JSONDecodeError as e:
+            logger.error(f"Failed to parse extracted info: {str(e)}")
+            return {}
+        except Exception as e:
+            logger.error(f"Error extracting information: {str(e)}")
+            return {}
+    
+    def _extract_json(self, prompt: str, requests: int = 1) -> Dict[str, Any]:
+        """
+        Ask the model for the JSON answer to an information extraction prompt
+        
+        Args:
+            prompt: Formatted extraction prompt, or several numbered ones
+            requests: Number of prompts packed into the prompt
+            
+        Returns:
+            The parsed JSON answer
+        """
+        response = self._chat_completion(
+            model=self.extract_model,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": f"Provide a JSON response: {prompt}"}
+            ],
+            temperature=0.1,
+            max_tokens=500 * requests,
+            response_format=_extraction_response_format(requests)
+        )
+        return orjson.loads(response.choices[0].message.content)
+    
+    def _clean_extracted_info(self, extracted_info: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Drop the fields a message did not give from extracted information
+        
+        Args:
+            extracted_info: Information as returned by the model
+            
+        Returns:
+            Cleaned dictionary of extracted information
+        """
+        return {key: value for key, value in extracted_info.items() if value not in (None, "", [])}
+    
+    def analyze_message(self, message: str, conversation_history: List[Dict[str, Any]],
+                        current_profile: Dict[str, Any], language: str = None,
+                        history_text: str = None, profile_text: str = None) -> Tuple[str, float, Dict[str, Any]]:
+        """
+        Detect intent and extract information from a message in one model call
+        
+        Args:
+            message: Customer's message
+            conversation_history: List of previous exchanges
+            current_profile: Current customer profile information
+            language: Language of the prompts to use (defaults to instance language)
+            history_text: Conversation history already formatted for a prompt, if the caller has it
+            profile_text: Profile already serialized for a prompt, if the caller has it
+            
+        Returns:
+            Tuple of (intent, confidence_score, extracted_info)
+        """
+        if history_text is None:
+            history_text = self._format_conversation_history(conversation_history)
+        if profile_text is None:
+            profile_text = orjson.dumps(current_profile).decode()
+        
+        prompt = self.get_prompts(language).get("combined_analysis", COMBINED_ANALYSIS_PROMPT)
+        prompt = render_prompt(prompt, history=history_text, message=message, current_profile=profile_text)
+        
+        try:
+            response = self._chat_completion(
+                model=self.extract_model,
                 messages=[
-                    {"role": "system", "content": "You extract structured information from messages and respond in JSON format."},
-                    {"role": "user", "content": f"Provide a JSON response: {prompt}"}
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
                 ],
                 temperature=0.1,
-                max_tokens=500,
-                response_format={"type": "json_object"}
+                max_tokens=550,
+                response_format=_json_schema_format("message_analysis", ANALYSIS_SCHEMA)
             )
-
             
-            extracted_info_text = response.choices[0].message.content.strip()
+            analysis = orjson.loads(response.choices[0].message.content)
+            intent = self._normalize_intent(analysis.get("intent"))
+            extracted = analysis.get("extracted")
+            extracted_info = self._clean_extracted_info(extracted) if isinstance(extracted, dict) else {}
+            
+            # Calculate confidence based on model's completion (simple approach)
+            confidence = 0.7  # Base confidence
+            if response.choices[0].finish_reason == "stop":
+                confidence += 0.1
+            
+            logger.info(f"Detected intent: {intent} with confidence: {confidence}")
+            return intent, confidence, extracted_info
             
-            try:
-                extracted_info = json.loads(extracted_info_text)
-                
-                # Clean up extracted info
-                cleaned_info = {}
-                for key, value in extracted_info.items():
-                    # Skip null or empty values
-                    if value is None or value == "" or value == []:
-                        continue
-                    
-                    # Normalize property values and loan amounts (convert text to numbers)
-                    if key == "property_value" or key == "loan_amount_needed":
-                        if isinstance(value, str):
-                            # Extract numeric portion from strings like "80 lakhs" or "1.5 crores"
-                            value = self._convert_indian_currency_to_number(value)
-                    
-                    cleaned_info[key] = value
-                
-                return cleaned_info
-            except json.JSONDecodeError:
-                logger.error(f"Failed to parse extracted info: {extracted_info_text}")
-                return {}
-                
         except Exception as e:
-            logger.error(f"Error extracting information: {str(e)}")
-            return {}
+            logger.error(f"Error analyzing message: {str(e)}")
+            # Return default intent with low confidence
+            return self.Intent.NEEDS_MORE_INFO, 0.5, {}
     
-    def generate_response(self, message: str, customer_profile: Dict[str, Any], conversation_history: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def generate_response(self, message: str, customer_profile: Dict[str, Any], conversation_history: List[Dict[str, Any]], language: str = None) -> Dict[str, Any]:
         """
         Generate appropriate response based on conversation state and customer intent
         
@@ -295,6 +805,7 @@ class ConversationEngine:
             message: Customer's message
             customer_profile: Customer profile information
             conversation_history: List of previous exchanges
+            language: Language of the prompts to use (defaults to instance language)
             
         Returns:
             Dictionary with response details
@@ -302,36 +813,50 @@ class ConversationEngine:
         # Extract current state
         current_state = customer_profile.get("conversation_state", self.State.INITIAL)
         
-        # Detect intent
-        intent, confidence = self.detect_intent(message, conversation_history)
+        prompts = self.get_prompts(language)
         
-        # Extract information from message
-        extracted_info = self.extract_information(message, customer_profile)
+        # Format conversation history and profile once for every prompt that uses them
+        history_text = self._format_conversation_history(conversation_history)
+        profile_text = orjson.dumps(customer_profile).decode()
+        
+        known_intent = self._known_intent(message, current_state, language)
+        if known_intent:
+            # Only the information may still need the model
+            intent, confidence = known_intent
+            if self._may_contain_information(message):
+                extracted_info = self.extract_information(message, customer_profile, language, profile_text=profile_text)
+            else:
+                extracted_info = {}
+        else:
+            # Detect intent and extract information in a single call
+            intent, confidence, extracted_info = self.analyze_message(
+                message, conversation_history, customer_profile, language,
+                history_text=history_text, profile_text=profile_text
+            )
+            self._remember_intent(message, current_state, language, intent, confidence)
         
         # Update state based on intent and current state
         new_state = self._update_state(current_state, intent)
         
         # Get prompt for the new state
-        prompt_key = new_state if new_state in self.prompts else "initial"
-        if prompt_key not in self.prompts:
+        prompt_key = new_state if new_state in prompts else "initial"
+        if prompt_key not in prompts:
             # Fallback to a generic prompt
             prompt = "You are a loan advisor. Respond professionally to the customer: {message}"
         else:
-            prompt = self.prompts[prompt_key]
-        
-        # Format conversation history for prompt
-        history_text = self._format_conversation_history(conversation_history)
+            prompt = prompts[prompt_key]
         
         # Format prompt with variables
-        prompt = prompt.replace("{history}", history_text)
-        prompt = prompt.replace("{profile}", json.dumps(customer_profile))
-        prompt = prompt.replace("{message}", message)
+        prompt = render_prompt(prompt, history=history_text, profile=profile_text, message=message)
+        
+        # Determine follow-up timing, which does not depend on the reply text
+        follow_up_date = self._calculate_follow_up_date(intent, new_state)
         
         try:
-            response = self.openai_client.chat.completions.create(
-                model=self.model,
+            response = self._chat_completion(
+                model=self.generation_model,
                 messages=[
-                    {"role": "system", "content": "You are a helpful loan-against-property advisor."},
+                    {"role": "system", "content": SYSTEM_PROMPT},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.7,
@@ -339,9 +864,12 @@ class ConversationEngine:
             )
             
             response_text = response.choices[0].message.content.strip()
-            
-            # Determine follow-up timing
-            follow_up_date = self._calculate_follow_up_date(intent, new_state)
+            if response.choices[0].finish_reason == "length":
+                # Send the complete sentences rather than a reply cut off mid-sentence
+                logger.warning("Reply reached max_tokens and was truncated")
+                sentence_end = max(response_text.rfind(mark) for mark in ".!?।")
+                if sentence_end > 0:
+                    response_text = response_text[:sentence_end + 1]
             
             # Determine if audio response would be beneficial
             should_generate_audio = self._should_generate_audio(response_text, new_state)
@@ -380,7 +908,7 @@ class ConversationEngine:
                 }
             }
     
-    def generate_followup(self, followup_context: Dict[str, Any], language: str = None) -> Dict[str, Any]:
+    def generate_followup(self, followup_context: FollowupContext, language: str = None) -> Dict[str, Any]:
         """
         Generate a follow-up message
         
@@ -394,29 +922,24 @@ class ConversationEngine:
         # Use specified language or default to instance language
         lang = language or self.language
         
-        # Create a system prompt for follow-up
-        system_prompt = f"""You are a loan-against-property advisor following up with a customer.
-You previously spoke with them about a loan against their property.
-Your goal is to check if they're ready to proceed or if they need more information.
-Be polite, professional, and not pushy. Reference specific details from your previous conversation."""
-        
-        user_prompt = f"""Generate a follow-up message for a customer with the following information:
+        user_prompt = f"""You previously spoke with this customer about a loan against their property.
+Generate a follow-up message for them with the following information:
         
-Customer name: {followup_context.get('customer_name', 'there')}
-Last conversation state: {followup_context.get('last_state', 'initial')}
-Follow-up reason: {followup_context.get('follow_up_reason', 'general follow-up')}
-Days since last contact: {followup_context.get('days_since_contact', 0)}
-Property details: {json.dumps(followup_context.get('property_details', {}))}
-Loan requirements: {json.dumps(followup_context.get('loan_requirements', {}))}
+Customer name: {followup_context.customer_name}
+Last conversation state: {followup_context.last_state}
+Follow-up reason: {followup_context.follow_up_reason or 'general follow-up'}
+Days since last contact: {followup_context.days_since_contact}
+Property details: {orjson.dumps(followup_context.property_details).decode()}
+Loan requirements: {orjson.dumps(followup_context.loan_requirements).decode()}
 
 The message should be concise, personalized, and provide clear next steps.
 """
         
         try:
-            response = self.openai_client.chat.completions.create(
-                model=self.model,
+            response = self._chat_completion(
+                model=self.generation_model,
                 messages=[
-                    {"role": "system", "content": system_prompt},
+                    {"role": "system", "content": SYSTEM_PROMPT},
                     {"role": "user", "content": user_prompt}
                 ],
                 temperature=0.7,
@@ -426,10 +949,10 @@ The message should be concise, personalized, and provide clear next steps.
             response_text = response.choices[0].message.content.strip()
             
             # Determine if audio would be beneficial
-            should_generate_audio = len(response_text) > 200 or "urgent" in followup_context.get('follow_up_reason', '').lower()
+            should_generate_audio = len(response_text) > 200 or "urgent" in (followup_context.follow_up_reason or '').lower()
             
             # Determine next state based on previous state
-            last_state = followup_context.get('last_state', self.State.INITIAL)
+            last_state = followup_context.last_state
             if last_state == self.State.NOT_INTERESTED:
                 new_state = self.State.NOT_INTERESTED
             elif last_state == self.State.COMPLETED:
@@ -447,9 +970,9 @@ The message should be concise, personalized, and provide clear next steps.
             logger.error(f"Error generating follow-up: {str(e)}")
             # Return a fallback follow-up
             return {
-                "text": f"Hello {followup_context.get('customer_name', 'there')}, this is ABC Finance following up on our conversation about a loan against your property. We're still here to help if you have any questions or would like to proceed. Feel free to reach out at your convenience.",
+                "text": f"Hello {followup_context.customer_name}, this is ABC Finance following up on our conversation about a loan against your property. We're still here to help if you have any questions or would like to proceed. Feel free to reach out at your convenience.",
                 "should_generate_audio": False,
-                "new_state": followup_context.get('last_state', self.State.INITIAL)
+                "new_state": followup_context.last_state
             }
     
     def generate_campaign_message(self, template: str, customer_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -528,15 +1051,8 @@ The message should be concise, personalized, and provide clear next steps.
         Returns:
             New conversation state
         """
-        # Get transitions for current state
-        transitions = self.state_transitions.get(current_state, {})
-        
-        # If there's a transition for this intent, use it
-        if intent in transitions:
-            return transitions[intent]
-            
-        # Otherwise, stay in the same state
-        return current_state
+        # Use the transition for this intent, otherwise stay in the same state
+        return self._TRANSITIONS.get((current_state, intent), current_state)
     
     def _format_conversation_history(self, conversation_history: List[Dict[str, Any]]) -> str:
         """
@@ -548,16 +1064,11 @@ The message should be concise, personalized, and provide clear next steps.
         Returns:
             Formatted conversation history text
         """
-        formatted_history = []
-        
         # Take the most recent exchanges that fit within token limit
-        for exchange in conversation_history[-10:]:  # Limit to last 10 exchanges
-            if exchange.get("direction") == "inbound":
-                formatted_history.append(f"Customer: {exchange.get('content', '')}")
-            else:
-                formatted_history.append(f"Agent: {exchange.get('content', '')}")
-        
-        return "\n".join(formatted_history)
+        return "\n".join(
+            f"{'Customer' if exchange.get('direction') == 'inbound' else 'Agent'}: {exchange.get('content', '')}"
+            for exchange in conversation_history[-self.HISTORY_EXCHANGES:]
+        )
     
     def _should_generate_audio(self, response_text: str, state: str) -> bool:
         """
@@ -579,8 +1090,7 @@ The message should be concise, personalized, and provide clear next steps.
             return True
             
         # Generate audio for complex information
-        if state in [self.State.LOAN_DETAILS] and any(term in response_text.lower() for term in 
-                                                    ["interest rate", "emi", "tenure", "processing fee"]):
+        if state == self.State.LOAN_DETAILS and self.AUDIO_LOAN_TERMS.search(response_text):
             return True
             
         return False
@@ -613,36 +1123,15 @@ The message should be concise, personalized, and provide clear next steps.
             
         # No follow-up for other states
         return None
+
+
+@lru_cache(maxsize=None)
+def get_conversation_engine() -> ConversationEngine:
+    """
+    Shared conversation engine for the process
     
-    def _convert_indian_currency_to_number(self, value_str: str) -> float:
-        """
-        Convert Indian currency expressions to numeric values
-        
-        Args:
-            value_str: String representation of value (e.g., "80 lakhs", "1.5 crores")
-            
-        Returns:
-            Numeric value in base units (rupees)
-        """
-        if not isinstance(value_str, str):
-            return value_str
-            
-        value_str = value_str.lower().strip()
-        
-        # Try to extract numeric portion
-        import re
-        numeric_match = re.search(r'(\d+\.?\d*)', value_str)
-        if not numeric_match:
-            return 0
-            
-        numeric_value = float(numeric_match.group(1))
-        
-        # Check for multipliers
-        if "lakh" in value_str or "lac" in value_str:
-            return numeric_value * 100000
-        elif "crore" in value_str or "cr" in value_str:
-            return numeric_value * 10000000
-        elif "k" in value_str or "thousand" in value_str:
-            return numeric_value * 1000
-        else:
-            return numeric_value
\ No newline at end of file
+    The engine keeps no per-conversation state and serves every language,
+    so the views and the tasks reuse one instance with its prompts,
+    classifier and batcher.
+    """
+    return ConversationEngine()
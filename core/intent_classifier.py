@@ -0,0 +1,142 @@
+# core/intent_classifier.py
+
+import json
+import logging
+import math
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from django.conf import settings
+
+from .client_factory import get_openai_client
+
+logger = logging.getLogger('core.intent_classifier')
+
+# Cosine similarities are close together, so they are scaled before the softmax
+EMBEDDING_SOFTMAX_SCALE = 50.0
+
+
+class IntentClassifier:
+    """Local intent classifier exported to ONNX, used before asking the chat model"""
+    
+    def __init__(self, model_dir):
+        """
+        Load the classifier
+        
+        Args:
+            model_dir: Directory with model.onnx, its tokenizer files and a
+                config.json whose id2label maps class ids to intent names
+        """
+        # Only needed when a classifier is configured
+        from onnxruntime import InferenceSession
+        from transformers import AutoTokenizer
+        
+        model_dir = Path(model_dir)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.session = InferenceSession(str(model_dir / "model.onnx"), providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        
+        with open(model_dir / "config.json") as f:
+            id_to_label = json.load(f)["id2label"]
+        self.labels = [id_to_label[str(i)] for i in range(len(id_to_label))]
+    
+    def classify(self, message: str) -> Tuple[str, float]:
+        """
+        Classify a message
+        
+        Args:
+            message: Customer's message
+        
+        Returns:
+            Tuple of (intent, probability)
+        """
+        tokens = self.tokenizer(message, return_tensors="np", truncation=True, max_length=128)
+        inputs = {name: value for name, value in tokens.items() if name in self.input_names}
+        logits = self.session.run(None, inputs)[0][0].tolist()
+        
+        # Softmax over the classes
+        top = max(logits)
+        weights = [math.exp(logit - top) for logit in logits]
+        index = weights.index(max(weights))
+        return self.labels[index], weights[index] / sum(weights)
+
+
+class EmbeddingIntentClassifier:
+    """Intent classifier comparing a message's embedding with the mean embedding of each intent's examples"""
+    
+    def __init__(self, centroids_file, model: str = None):
+        """
+        Load the intent centroids
+        
+        Args:
+            centroids_file: .npz file written by build_intent_centroids
+            model: Embedding model the centroids were built with
+        """
+        with np.load(centroids_file) as data:
+            self.labels = [str(label) for label in data["labels"]]
+            self.centroids = data["centroids"].astype(np.float32)
+        self.model = model or settings.INTENT_EMBEDDING_MODEL
+        self.openai_client = get_openai_client()
+    
+    def classify(self, message: str) -> Tuple[str, float]:
+        """
+        Classify a message
+        
+        Args:
+            message: Customer's message
+        
+        Returns:
+            Tuple of (intent, probability)
+        """
+        embedding = _embed(self.openai_client, self.model, [message])[0]
+        
+        # Softmax over the similarity to each centroid
+        scores = (self.centroids @ embedding) * EMBEDDING_SOFTMAX_SCALE
+        weights = np.exp(scores - scores.max())
+        index = int(weights.argmax())
+        return self.labels[index], float(weights[index] / weights.sum())
+
+
+def _embed(openai_client, model: str, texts: List[str]) -> np.ndarray:
+    """Unit-length embeddings of texts, one row per text"""
+    response = openai_client.embeddings.create(model=model, input=texts)
+    embeddings = np.array([item.embedding for item in response.data], dtype=np.float32)
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+def build_intent_centroids(examples: Dict[str, List[str]], centroids_file, model: str = None):
+    """
+    Embed example messages for each intent and save their mean embeddings
+    
+    Args:
+        examples: Example customer messages by intent
+        centroids_file: .npz file to write
+        model: Embedding model to use (defaults to INTENT_EMBEDDING_MODEL)
+    """
+    model = model or settings.INTENT_EMBEDDING_MODEL
+    openai_client = get_openai_client()
+    
+    labels = list(examples)
+    centroids = np.stack([_embed(openai_client, model, examples[label]).mean(axis=0) for label in labels])
+    centroids /= np.linalg.norm(centroids, axis=1, keepdims=True)
+    np.savez(centroids_file, labels=np.array(labels), centroids=centroids)
+
+
+@lru_cache(maxsize=None)
+def get_intent_classifier() -> Optional[Union[IntentClassifier, EmbeddingIntentClassifier]]:
+    """
+    The configured intent classifier, or None if there is none or it cannot be loaded
+    
+    An ONNX model in INTENT_CLASSIFIER_DIR is preferred over the embedding
+    centroids in INTENT_CENTROIDS_FILE, which cost an embedding call per message.
+    """
+    try:
+        if settings.INTENT_CLASSIFIER_DIR:
+            return IntentClassifier(settings.INTENT_CLASSIFIER_DIR)
+        if settings.INTENT_CENTROIDS_FILE:
+            return EmbeddingIntentClassifier(settings.INTENT_CENTROIDS_FILE)
+    except Exception as e:
+        logger.warning(f"Intent classifier unavailable, using the chat model: {str(e)}")
+    return None
@@ -1,35 +1,126 @@
 # core/language.py
 
+import hashlib
 import logging
-import tempfile
-from typing import Dict, Any, Optional
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from types import MappingProxyType
+from typing import Dict, Any, Optional, Union
 import os
+import uuid
 
 from django.conf import settings
+from django.core.cache import cache
 import requests
-import openai
+
+from .client_factory import get_openai_client
 
 logger = logging.getLogger('core.language')
 
+# Supported languages and their ISO codes, shared by every processor
+SUPPORTED_LANGUAGES = MappingProxyType({
+    "english": "en",
+    "hindi": "hi",
+    "kannada": "kn",
+    "tamil": "ta",
+    "telugu": "te"
+})
+
+# Inverse mapping from codes to language names
+LANGUAGE_CODES = MappingProxyType({code: name for name, code in SUPPORTED_LANGUAGES.items()})
+
+# Exact answers the model gives for a language, by name or code
+_LANGUAGE_ALIASES = MappingProxyType({**{name: name for name in SUPPORTED_LANGUAGES}, **LANGUAGE_CODES})
+
+# Customers repeat short messages and outbound snippets are reused, so
+# detected languages and translations are cached for every worker
+LANGUAGE_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+LANGUAGE_CACHE_MAX_TEXT = 200
+
+# Largest completion budget for a translation; a cut-off translation is retried with it once
+TRANSLATION_MAX_TOKENS = 4096
+
+# Speech is generated with one model and voice, so cached audio is keyed by text alone
+TTS_MODEL = "tts-1"
+TTS_VOICE = "alloy"
+
+# Local language identification below this probability defaults to English
+LANGUAGE_ID_MIN_CONFIDENCE = 0.5
+
+
+# Supported languages by the 128-codepoint Unicode block of their script
+_SCRIPT_BLOCK_LANGUAGES = {
+    0x0900 >> 7: "hindi",  # Devanagari
+    0x0B80 >> 7: "tamil",
+    0x0C00 >> 7: "telugu",
+    0x0C80 >> 7: "kannada",
+}
+SCRIPT_SAMPLE_LENGTH = 64
+SCRIPT_MIN_SHARE = 0.6
+
+
+def _script_language(text: str) -> Optional[str]:
+    """
+    Guess the language of text from the script of its non-ASCII characters
+    
+    Args:
+        text: Text to detect language for
+        
+    Returns:
+        Language name if most non-ASCII characters are in one supported
+        script, otherwise None (including for romanized text)
+    """
+    blocks = Counter(ord(char) >> 7 for char in text[:SCRIPT_SAMPLE_LENGTH] if ord(char) > 127)
+    if not blocks:
+        return None
+    
+    block, count = blocks.most_common(1)[0]
+    if count < SCRIPT_MIN_SHARE * sum(blocks.values()):
+        return None
+    return _SCRIPT_BLOCK_LANGUAGES.get(block)
+
+
+def _translation_max_tokens(text: str, into_english: bool) -> int:
+    """
+    Completion budget for translating text, within the model's output limit
+    
+    English takes about four characters per token, so half the source
+    length leaves room to spare. Indic scripts can take a token or more
+    per character, so translations into them keep twice the source length.
+    """
+    budget = len(text) // 2 if into_english else len(text) * 2
+    return max(64, min(TRANSLATION_MAX_TOKENS, budget))
+
+
+@lru_cache(maxsize=None)
+def get_language_identifier():
+    """The configured fastText language identification model, or None if there is none or it cannot be loaded"""
+    model_path = settings.LANGUAGE_ID_MODEL
+    if not model_path:
+        return None
+    
+    try:
+        # Only needed when a model is configured
+        import fasttext
+        return fasttext.load_model(model_path)
+    except Exception as e:
+        logger.warning(f"Language identification model unavailable, using the chat model: {str(e)}")
+        return None
+
+
 class LanguageProcessor:
     """Module for language detection, translation, and processing"""
     
     def __init__(self):
         """Initialize the language processor"""
-        self.supported_languages = {
-            "english": "en",
-            "hindi": "hi",
-            "kannada": "kn",
-            "tamil": "ta",
-            "telugu": "te"
-        }
-        
-        # Inverse mapping from codes to language names
-        self.language_codes = {code: name for name, code in self.supported_languages.items()}
+        self.supported_languages = SUPPORTED_LANGUAGES
+        self.language_codes = LANGUAGE_CODES
         
         # Initialize OpenAI client
-        self.openai_client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.openai_client = get_openai_client()
         self.model = settings.DEFAULT_AI_MODEL
+        self.language_identifier = get_language_identifier()
     
     def detect_language(self, text: str) -> str:
         """
@@ -41,8 +132,25 @@ class LanguageProcessor:
         Returns:
             Language name (e.g., "english", "hindi")
         """
-        if not text or len(text.strip()) < 5:
-            return "english"  # Default to English for very short or empty text
+        if not text:
+            return "english"
+        
+        # Text in an Indic script needs no model to tell its language, however short
+        script_language = _script_language(text)
+        if script_language:
+            return script_language
+        
+        if len(text.strip()) < 5:
+            return "english"  # Default to English for very short text
+        
+        if self.language_identifier:
+            return self._identify_language(text)
+        
+        # Case and spacing do not change the language, and the start of a long text is enough
+        cache_key = self._cache_key("language", " ".join(text.lower().split())[:LANGUAGE_CACHE_MAX_TEXT])
+        detected_language = cache.get(cache_key)
+        if detected_language:
+            return detected_language
         
         try:
             # Use OpenAI for language detection
@@ -57,29 +165,66 @@ class LanguageProcessor:
                 temperature=0.1,
                 max_tokens=10
             )
-            
-            detected_language = response.choices[0].message.content.strip().lower()
-            
-            # Normalize language name
-            if detected_language in self.supported_languages:
-                return detected_language
-            
-            # Try to match partial language names
-            for lang in self.supported_languages:
-                if lang in detected_language:
-                    return lang
-            
-            # Check for language codes
-            for code, lang in self.language_codes.items():
-                if code in detected_language:
-                    return lang
-            
-            logger.info(f"Detected unsupported language: {detected_language}, defaulting to English")
-            return "english"
-        
         except Exception as e:
             logger.error(f"Error detecting language: {str(e)}")
             return "english"  # Default to English on error
+        
+        detected_language = self._normalize_language(response.choices[0].message.content)
+        cache.set(cache_key, detected_language, LANGUAGE_CACHE_TIMEOUT)
+        return detected_language
+    
+    def _identify_language(self, text: str) -> str:
+        """
+        Detect the language of text with the local fastText model
+        
+        Args:
+            text: Text to detect language for
+            
+        Returns:
+            Language name, or English if the language is unsupported or uncertain
+        """
+        # fastText predicts one line at a time
+        labels, probabilities = self.language_identifier.predict(" ".join(text.split()), k=1)
+        language_code = labels[0].replace("__label__", "")
+        
+        if probabilities[0] < LANGUAGE_ID_MIN_CONFIDENCE:
+            return "english"
+        return self.language_codes.get(language_code, "english")
+    
+    def _normalize_language(self, detected_language: str) -> str:
+        """
+        Map the model's answer onto a supported language
+        
+        Args:
+            detected_language: Language name returned by the model
+            
+        Returns:
+            Supported language name, or English if the language is not supported
+        """
+        detected_language = (detected_language or "").strip().strip(".'\"").lower()
+        
+        # Exact language names and codes
+        language = _LANGUAGE_ALIASES.get(detected_language)
+        if language:
+            return language
+        
+        # Try to match partial language names
+        for lang in self.supported_languages:
+            if lang in detected_language:
+                return lang
+        
+        # Check for language codes
+        for code, lang in self.language_codes.items():
+            if code in detected_language:
+                return lang
+        
+        logger.info(f"Detected unsupported language: {detected_language}, defaulting to English")
+        return "english"
+    
+    def _cache_key(self, kind: str, *parts: str) -> str:
+        """Cache key for a model answer about some text"""
+        key_source = ":".join((self.model,) + parts)
+        return f"{kind}:{hashlib.sha256(key_source.encode()).hexdigest()}"
     
     def translate_to_english(self, text: str, source_language: str = None) -> str:
         """
@@ -104,29 +249,56 @@ class LanguageProcessor:
             if source_language == "english":
                 return text
         
+        cache_key = self._cache_key("translation", source_language, "english", text)
+        cached_translation = cache.get(cache_key)
+        if cached_translation is not None:
+            return cached_translation
+        
         try:
             # Use OpenAI for translation
             prompt = f"Translate the following {source_language} text to English. Preserve the meaning and tone.\n\nText: {text}\n\nEnglish translation:"
             
-            response = self.openai_client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a professional translator."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=len(text) * 2  # Allow for expansion during translation
-            )
-            
-            translated_text = response.choices[0].message.content.strip()
+            translated_text = self._request_translation(prompt, text, into_english=True)
+            if translated_text is None:
+                return text  # Return original text rather than a cut-off translation
             
             logger.info(f"Translated {len(text)} chars from {source_language} to English")
+            cache.set(cache_key, translated_text, LANGUAGE_CACHE_TIMEOUT)
             return translated_text
             
         except Exception as e:
             logger.error(f"Error translating to English: {str(e)}")
             return text  # Return original text on error
     
+    def _request_translation(self, prompt: str, text: str, into_english: bool) -> Optional[str]:
+        """
+        Ask the model for a translation, retrying once with the largest budget if it is cut off
+        
+        Args:
+            prompt: Translation prompt
+            text: Text being translated, which sets the first budget
+            into_english: Whether the translation is into English
+            
+        Returns:
+            The translated text, or None if it was still cut off, so that it is neither cached nor sent
+        """
+        budget = _translation_max_tokens(text, into_english)
+        budgets = [budget] if budget >= TRANSLATION_MAX_TOKENS else [budget, TRANSLATION_MAX_TOKENS]
+        for max_tokens in budgets:
+            response = self.openai_client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": "You are a professional translator."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0,
+                max_tokens=max_tokens
+            )
+            if response.choices[0].finish_reason != "length":
+                return response.choices[0].message.content.strip()
+            logger.warning(f"Translation of {len(text)} chars was cut off at {max_tokens} tokens")
+        return None
+    
     def translate_from_english(self, text: str, target_language: str) -> str:
         """
         Translate text from English to target language
@@ -145,47 +317,53 @@ class LanguageProcessor:
             logger.warning(f"Unsupported target language: {target_language}, defaulting to English")
             return text
         
+        cache_key = self._cache_key("translation", "english", target_language, text)
+        cached_translation = cache.get(cache_key)
+        if cached_translation is not None:
+            return cached_translation
+        
         try:
             # Use OpenAI for translation
             prompt = f"Translate the following English text to {target_language}. Preserve the meaning and tone.\n\nText: {text}\n\n{target_language.capitalize()} translation:"
             
-            response = self.openai_client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a professional translator."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=len(text) * 2  # Allow for expansion during translation
-            )
-            
-            translated_text = response.choices[0].message.content.strip()
+            translated_text = self._request_translation(prompt, text, into_english=False)
+            if translated_text is None:
+                return text  # Return original text rather than a cut-off translation
             
             logger.info(f"Translated {len(text)} chars from English to {target_language}")
+            cache.set(cache_key, translated_text, LANGUAGE_CACHE_TIMEOUT)
             return translated_text
             
         except Exception as e:
             logger.error(f"Error translating from English: {str(e)}")
             return text  # Return original text on error
     
-    def speech_to_text(self, audio_file: str) -> Dict[str, Any]:
+    def speech_to_text(self, audio: Union[bytes, str], filename: str = "audio.ogg") -> Dict[str, Any]:
         """
         Convert speech audio to text and detect language
         
         Args:
-            audio_file: Path to the audio file
+            audio: Audio content as bytes, or the path to an audio file
+            filename: Name sent with in-memory audio so the API can tell its format
             
         Returns:
             Dictionary with transcribed text and detected language
         """
         try:
             # Use OpenAI Whisper API for speech-to-text
-            with open(audio_file, "rb") as audio:
+            if isinstance(audio, bytes):
                 response = self.openai_client.audio.transcriptions.create(
                     model="whisper-1",
-                    file=audio,
+                    file=(filename, audio),
                     response_format="verbose_json"
                 )
+            else:
+                with open(audio, "rb") as audio_file:
+                    response = self.openai_client.audio.transcriptions.create(
+                        model="whisper-1",
+                        file=audio_file,
+                        response_format="verbose_json"
+                    )
             
             # Extract text and language
             transcribed_text = response.text
@@ -208,7 +386,7 @@ class LanguageProcessor:
                 "language": "english"
             }
     
-    def text_to_speech(self, text: str, language: str) -> str:
+    def text_to_speech(self, text: str, language: str) -> Optional[bytes]:
         """
         Convert text to speech in specified language
         
@@ -217,7 +395,7 @@ class LanguageProcessor:
             language: Language of the text
             
         Returns:
-            Path to the generated audio file
+            Generated MP3 audio as bytes
         """
         if not text:
             return None
@@ -225,22 +403,38 @@ class LanguageProcessor:
         # Get language code
         language_code = self.supported_languages.get(language, "en")
         
+        # Identical texts, such as canned replies, reuse audio generated before
+        key_source = f"{TTS_MODEL}:{TTS_VOICE}:{text}"
+        cache_path = Path(settings.TTS_CACHE_DIR) / f"{hashlib.sha256(key_source.encode()).hexdigest()}.mp3"
+        try:
+            audio_content = cache_path.read_bytes()
+            # Recently used audio is kept longest by the cleanup task
+            os.utime(cache_path)
+            return audio_content
+        except FileNotFoundError:
+            pass
+        
         try:
             # Use OpenAI TTS API for text-to-speech
             response = self.openai_client.audio.speech.create(
-                model="tts-1",
-                voice="alloy",  # Available voices: alloy, echo, fable, onyx, nova, shimmer
+                model=TTS_MODEL,
+                voice=TTS_VOICE,  # Available voices: alloy, echo, fable, onyx, nova, shimmer
                 input=text
             )
             
-            # Save the audio to a temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as temp_file:
-                temp_file.write(response.content)
-                audio_path = temp_file.name
-            
             logger.info(f"Generated speech audio for {len(text)} chars in {language}")
-            return audio_path
             
         except Exception as e:
             logger.error(f"Error converting text to speech: {str(e)}")
-            return None
\ No newline at end of file
+            return None
+        
+        # Write under a temporary name first, so no reader sees a partial file
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = cache_path.with_name(f"{cache_path.name}.{uuid.uuid4().hex}.tmp")
+            temp_path.write_bytes(response.content)
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            logger.warning(f"Failed to cache speech audio: {str(e)}")
+        
+        return response.content
\ No newline at end of file
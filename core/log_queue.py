@@ -0,0 +1,119 @@
+# core/log_queue.py
+
+import atexit
+import gzip
+import logging
+import os
+import queue
+import shutil
+import weakref
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+import orjson
+from django.conf import settings
+
+# Records waiting for the background writer; bounded so a stalled disk
+# cannot grow it without limit
+LOG_QUEUE = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+
+_listener = None
+# Handlers feeding LOG_QUEUE, rebound when a forked child replaces it
+_queue_handlers = weakref.WeakSet()
+
+
+class OrjsonFormatter(logging.Formatter):
+    """Formats each record as one JSON object"""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "module": record.module,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry).decode()
+
+
+class GzipRotatingFileHandler(RotatingFileHandler):
+    """Rotating file handler that gzips each file it rotates out"""
+
+    def rotation_filename(self, default_name):
+        return default_name + ".gz"
+
+    def rotate(self, source, dest):
+        with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.remove(source)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self):
+        super().__init__(LOG_QUEUE)
+        _queue_handlers.add(self)
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+class _DrainingQueueListener(QueueListener):
+    """Queue listener whose stop waits for room in a full queue"""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+def _file_handler():
+    """Rotating JSON file handler fed by the queue listener"""
+    handler = GzipRotatingFileHandler(
+        settings.LOG_FILE,
+        maxBytes=settings.LOG_FILE_MAX_BYTES,
+        backupCount=settings.LOG_FILE_BACKUP_COUNT,
+    )
+    handler.setLevel(logging.INFO)
+    handler.setFormatter(OrjsonFormatter())
+    return handler
+
+
+def start_log_listener():
+    """Start the background thread that writes queued records to the log file"""
+    global _listener
+    if _listener is not None:
+        return
+    _listener = _DrainingQueueListener(LOG_QUEUE, _file_handler(), respect_handler_level=True)
+    _listener.start()
+
+
+def stop_log_listener():
+    """Flush queued records and stop the background writer"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+
+def _restart_in_child():
+    # A forked child (Celery prefork worker) gets a fresh queue: the inherited one holds
+    # records the parent will write itself, and its lock may have been held at fork time.
+    # The writer thread does not survive fork either, so it is started again.
+    global LOG_QUEUE, _listener
+    LOG_QUEUE = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    for handler in _queue_handlers:
+        handler.queue = LOG_QUEUE
+    if _listener is None:
+        return
+    _listener = None
+    start_log_listener()
+
+
+atexit.register(stop_log_listener)
+os.register_at_fork(after_in_child=_restart_in_child)
@@ -0,0 +1,61 @@
+# core/rate_limit.py
+
+import logging
+import time
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger('core.rate_limit')
+
+# Counts calls in a one-second window that starts with its first call.
+# Returns 0 if the call fits in the window, otherwise the ms until it resets.
+TOKEN_BUCKET_SCRIPT = """
+local count = redis.call('INCR', KEYS[1])
+if count == 1 then
+    redis.call('PEXPIRE', KEYS[1], 1000)
+end
+if count <= tonumber(ARGV[1]) then
+    return 0
+end
+local ttl = redis.call('PTTL', KEYS[1])
+if ttl < 1 then
+    return 1
+end
+return ttl
+"""
+
+
+@lru_cache(maxsize=None)
+def get_rate_limit_redis():
+    """Shared client for the rate limit Redis"""
+    return redis.Redis.from_url(settings.RATE_LIMIT_REDIS_URL, socket_timeout=1)
+
+
+@lru_cache(maxsize=None)
+def _token_bucket():
+    """Registered token bucket script on the rate limit Redis"""
+    return get_rate_limit_redis().register_script(TOKEN_BUCKET_SCRIPT)
+
+
+def acquire_token(key, rate_per_sec):
+    """
+    Wait for a slot in a per-second budget shared by every worker
+    
+    Args:
+        key: Redis key of the budget, e.g. "whatsapp:send"
+        rate_per_sec: Calls allowed per second across all workers
+    
+    Returns:
+        True once a slot is acquired, False if Redis is unavailable
+    """
+    try:
+        while True:
+            wait_ms = _token_bucket()(keys=[key], args=[rate_per_sec])
+            if not wait_ms:
+                return True
+            time.sleep(wait_ms / 1000)
+    except redis.RedisError as e:
+        logger.warning(f"Shared rate limit unavailable, falling back to local pacing: {str(e)}")
+        return False
@@ -1,21 +1,51 @@
 # core/whatsapp.py
 
+import importlib.util
 import logging
-import requests
-import json
 import time
 import os
 import tempfile
 from urllib.parse import urljoin
 import backoff
+import httpx
+import orjson
+import redis
+from typing import NamedTuple, Optional
 
 from django.conf import settings
 from django.utils import timezone
+from django.core.cache import cache
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
 
+from .rate_limit import get_rate_limit_redis
+
 logger = logging.getLogger('core.whatsapp')
 
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Media URLs are valid for five minutes; reuse them for a little less
+MEDIA_URL_CACHE_TIMEOUT = 4 * 60
+
+
+class SendResult(NamedTuple):
+    """Outcome of sending a message"""
+    ok: bool
+    message_id: Optional[str] = None
+    error: Optional[str] = None
+    
+    @classmethod
+    def sent(cls, response):
+        """Result for a successful /messages API response"""
+        messages = response.get("messages")
+        return cls(True, messages[0].get("id") if messages else None)
+    
+    @classmethod
+    def failed(cls, error):
+        """Result for a message that was not sent"""
+        return cls(False, error=error)
+
+
 class WhatsAppClient:
     """Client for interacting with WhatsApp Business API"""
     
@@ -35,20 +65,37 @@ class WhatsAppClient:
         self.version = version or settings.WHATSAPP_API_VERSION
         self.base_url = f"https://graph.facebook.com/{self.version}/{self.phone_number_id}"
         self.headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
+            "Authorization": f"Bearer {self.api_key}"
         }
         
-        # Track message counts for rate limiting
-        self.message_counts = {}
+        # Calls reuse pooled connections to the Graph API instead of a new
+        # TLS handshake per message; HTTP/2 is used when h2 is installed
+        self._http = httpx.Client(
+            http2=importlib.util.find_spec("h2") is not None,
+            headers=self.headers,
+            timeout=httpx.Timeout(30.0, connect=5.0),
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+            follow_redirects=True,
+        )
+        
+        # Daily message counts and conversation windows per recipient are kept
+        # in Redis, so every worker sees the same ones and they survive restarts
+        self.redis = get_rate_limit_redis()
         self.rate_limit = 1000  # Default daily limit per recipient
-        
-        # Track conversation windows
-        self.conversation_windows = {}
         self.window_duration = 24 * 60 * 60  # 24 hours in seconds
     
+    def close(self):
+        """Close the client's pooled connections"""
+        self._http.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
     @backoff.on_exception(backoff.expo, 
-                         requests.exceptions.RequestException,
+                         httpx.HTTPError,
                          max_tries=5)
     def send_text(self, recipient_phone, text):
         """
@@ -59,12 +106,12 @@ class WhatsAppClient:
             text: Message text
             
         Returns:
-            API response
+            SendResult with the message ID or the error
         """
         # Check rate limits
         if not self._check_rate_limit(recipient_phone):
             logger.warning(f"Rate limit exceeded for {recipient_phone}")
-            return {"error": "Rate limit exceeded"}
+            return SendResult.failed("Rate limit exceeded")
         
         # Check conversation window
         if not self._check_conversation_window(recipient_phone):
@@ -90,9 +137,7 @@ class WhatsAppClient:
         }
         
         try:
-            response = requests.post(url, headers=self.headers, json=payload)
-            response.raise_for_status()
-            result = response.json()
+            result = self._post_json(url, payload)
             
             # Update rate limit counter
             self._update_message_count(recipient_phone)
@@ -100,21 +145,20 @@ class WhatsAppClient:
             self._update_conversation_window(recipient_phone)
             
             logger.info(f"Successfully sent text message to {recipient_phone}")
-            return result
-        except requests.exceptions.RequestException as e:
+            return SendResult.sent(result)
+        except httpx.HTTPError as e:
             logger.error(f"Failed to send text message to {recipient_phone}: {str(e)}")
             
             # Try to get response details if available
             try:
-                error_details = e.response.json()
-                logger.error(f"Error details: {json.dumps(error_details)}")
+                logger.error(f"Error details: {e.response.text}")
             except:
                 pass
                 
             raise
     
     @backoff.on_exception(backoff.expo, 
-                         requests.exceptions.RequestException,
+                         httpx.HTTPError,
                          max_tries=5)
     def send_audio(self, recipient_phone, audio_path):
         """
@@ -125,24 +169,24 @@ class WhatsAppClient:
             audio_path: Path to audio file
             
         Returns:
-            API response
+            SendResult with the message ID or the error
         """
         # Check rate limits
         if not self._check_rate_limit(recipient_phone):
             logger.warning(f"Rate limit exceeded for {recipient_phone}")
-            return {"error": "Rate limit exceeded"}
+            return SendResult.failed("Rate limit exceeded")
         
         # Check conversation window
         if not self._check_conversation_window(recipient_phone):
             logger.warning(f"Conversation window expired for {recipient_phone}, cannot send audio")
-            return {"error": "Conversation window expired"}
+            return SendResult.failed("Conversation window expired")
         
         # First, upload the media
         media_id = self._upload_media(audio_path, "audio/mpeg")
         
         if not media_id:
             logger.error(f"Failed to upload audio for {recipient_phone}")
-            return {"error": "Failed to upload audio"}
+            return SendResult.failed("Failed to upload audio")
         
         # Now send the audio message
         url = f"{self.base_url}/messages"
@@ -158,9 +202,7 @@ class WhatsAppClient:
         }
         
         try:
-            response = requests.post(url, headers=self.headers, json=payload)
-            response.raise_for_status()
-            result = response.json()
+            result = self._post_json(url, payload)
             
             # Update rate limit counter
             self._update_message_count(recipient_phone)
@@ -168,13 +210,13 @@ class WhatsAppClient:
             self._update_conversation_window(recipient_phone)
             
             logger.info(f"Successfully sent audio message to {recipient_phone}")
-            return result
-        except requests.exceptions.RequestException as e:
+            return SendResult.sent(result)
+        except httpx.HTTPError as e:
             logger.error(f"Failed to send audio message to {recipient_phone}: {str(e)}")
             raise
     
     @backoff.on_exception(backoff.expo, 
-                         requests.exceptions.RequestException,
+                         httpx.HTTPError,
                          max_tries=5)
     def send_template(self, recipient_phone, template_name, template_params):
         """
@@ -186,13 +228,13 @@ class WhatsAppClient:
             template_params: Template parameters
             
         Returns:
-            API response
+            SendResult with the message ID or the error
         """
         # Templates can be sent even if conversation window has expired
         # Check rate limits only
         if not self._check_rate_limit(recipient_phone):
             logger.warning(f"Rate limit exceeded for {recipient_phone}")
-            return {"error": "Rate limit exceeded"}
+            return SendResult.failed("Rate limit exceeded")
         
         url = f"{self.base_url}/messages"
         
@@ -229,9 +271,7 @@ class WhatsAppClient:
         }
         
         try:
-            response = requests.post(url, headers=self.headers, json=payload)
-            response.raise_for_status()
-            result = response.json()
+            result = self._post_json(url, payload)
             
             # Update rate limit counter
             self._update_message_count(recipient_phone)
@@ -239,11 +279,26 @@ class WhatsAppClient:
             self._update_conversation_window(recipient_phone)
             
             logger.info(f"Successfully sent template message to {recipient_phone}")
-            return result
-        except requests.exceptions.RequestException as e:
+            return SendResult.sent(result)
+        except httpx.HTTPError as e:
             logger.error(f"Failed to send template message to {recipient_phone}: {str(e)}")
             raise
     
+    def _post_json(self, url, payload):
+        """
+        POST a JSON payload to the API
+        
+        Args:
+            url: API endpoint
+            payload: Request body
+            
+        Returns:
+            The parsed JSON response
+        """
+        response = self._http.post(url, content=orjson.dumps(payload), headers=_JSON_HEADERS)
+        response.raise_for_status()
+        return orjson.loads(response.content)
+    
     def download_media(self, media_id):
         """
         Download media content
@@ -254,26 +309,28 @@ class WhatsAppClient:
         Returns:
             Media content as bytes
         """
-        # First, get the media URL
-        url = f"https://graph.facebook.com/{self.version}/{media_id}"
-        
         try:
-            response = requests.get(url, headers=self.headers)
-            response.raise_for_status()
-            media_info = response.json()
-            
-            if "url" not in media_info:
-                logger.error(f"No URL in media info for ID {media_id}")
-                return None
-            
-            media_url = media_info["url"]
+            # First, get the media URL, unless it was resolved within the last few minutes
+            cache_key = f"whatsapp:media_url:{media_id}"
+            media_url = cache.get(cache_key)
+            if media_url is None:
+                response = self._http.get(f"https://graph.facebook.com/{self.version}/{media_id}")
+                response.raise_for_status()
+                media_info = orjson.loads(response.content)
+                
+                if "url" not in media_info:
+                    logger.error(f"No URL in media info for ID {media_id}")
+                    return None
+                
+                media_url = media_info["url"]
+                cache.set(cache_key, media_url, MEDIA_URL_CACHE_TIMEOUT)
             
             # Now download the actual media
-            media_response = requests.get(media_url, headers=self.headers)
+            media_response = self._http.get(media_url)
             media_response.raise_for_status()
             
             return media_response.content
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Failed to download media ID {media_id}: {str(e)}")
             return None
     
@@ -296,15 +353,14 @@ class WhatsAppClient:
                     "file": (os.path.basename(file_path), file, mime_type)
                 }
                 
-                response = requests.post(
+                response = self._http.post(
                     url, 
-                    headers={"Authorization": f"Bearer {self.api_key}"},
                     data={"messaging_product": "whatsapp"},
                     files=files
                 )
                 
                 response.raise_for_status()
-                result = response.json()
+                result = orjson.loads(response.content)
                 
                 return result.get("id")
         except Exception as e:
@@ -321,11 +377,12 @@ class WhatsAppClient:
         Returns:
             True if under limit, False if exceeded
         """
-        today = time.strftime("%Y-%m-%d")
-        key = f"{recipient_phone}:{today}"
-        
-        count = self.message_counts.get(key, 0)
-        return count < self.rate_limit
+        try:
+            count = self.redis.get(self._message_count_key(recipient_phone))
+        except redis.RedisError as e:
+            logger.warning(f"Message counts unavailable, not rate limiting {recipient_phone}: {str(e)}")
+            return True
+        return int(count or 0) < self.rate_limit
     
     def _update_message_count(self, recipient_phone):
         """
@@ -334,10 +391,15 @@ class WhatsAppClient:
         Args:
             recipient_phone: Recipient's phone number
         """
-        today = time.strftime("%Y-%m-%d")
-        key = f"{recipient_phone}:{today}"
-        
-        self.message_counts[key] = self.message_counts.get(key, 0) + 1
+        key = self._message_count_key(recipient_phone)
+        try:
+            self.redis.pipeline().incr(key).expire(key, 24 * 60 * 60).execute()
+        except redis.RedisError as e:
+            logger.warning(f"Failed to count message to {recipient_phone}: {str(e)}")
+    
+    def _message_count_key(self, recipient_phone):
+        """Redis key of today's (UTC) message count for a recipient"""
+        return f"whatsapp:sent:{recipient_phone}:{int(time.time() // 86400)}"
     
     def _check_conversation_window(self, recipient_phone):
         """
@@ -349,10 +411,13 @@ class WhatsAppClient:
         Returns:
             True if window is active, False otherwise
         """
-        now = time.time()
-        window_start = self.conversation_windows.get(recipient_phone, 0)
-        
-        return (now - window_start) < self.window_duration
+        # The key expires when the window closes
+        try:
+            return bool(self.redis.exists(f"whatsapp:window:{recipient_phone}"))
+        except redis.RedisError as e:
+            # Most messages are replies to a customer who has just written, so assume the window is open
+            logger.warning(f"Conversation windows unavailable, assuming open for {recipient_phone}: {str(e)}")
+            return True
     
     def _update_conversation_window(self, recipient_phone):
         """
@@ -361,7 +426,10 @@ class WhatsAppClient:
         Args:
             recipient_phone: Recipient's phone number
         """
-        self.conversation_windows[recipient_phone] = time.time()
+        try:
+            self.redis.set(f"whatsapp:window:{recipient_phone}", time.time(), ex=self.window_duration)
+        except redis.RedisError as e:
+            logger.warning(f"Failed to open conversation window for {recipient_phone}: {str(e)}")
     
     def mark_message_read(self, message_id):
         """
@@ -382,13 +450,11 @@ class WhatsAppClient:
         }
         
         try:
-            response = requests.post(url, headers=self.headers, json=payload)
-            response.raise_for_status()
-            result = response.json()
+            result = self._post_json(url, payload)
             
             logger.info(f"Successfully marked message {message_id} as read")
             return result
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Failed to mark message {message_id} as read: {str(e)}")
             return {"error": str(e)}
     
@@ -7,6 +7,9 @@ export USE_WHATSAPP_SIMULATOR=True
 # Apply migrations
 python manage.py migrate
 
+# Collect static files (hashed and compressed for WhiteNoise)
+python manage.py collectstatic --noinput
+
 # Load initial data
 python manage.py loaddata initial_data.json
 
@@ -1,6 +1,6 @@
 # simulator/management/commands/init_simulator.py
 from django.core.management.base import BaseCommand
-from simulator.simulator import WhatsAppSimulator
+from simulator.simulator import get_simulator
 from agent.models import Template
 
 class Command(BaseCommand):
@@ -10,19 +10,14 @@ class Command(BaseCommand):
         self.stdout.write('Initializing WhatsApp simulator...')
         
         # Create simulator instance
-        simulator = WhatsAppSimulator()
+        simulator = get_simulator()
         
-        # Load templates from database
-        templates = Template.objects.filter(is_approved=True)
-        
-        for template in templates:
-            simulator.templates[template.name] = {
-                'name': template.name,
-                'language_code': template.language_code,
-                'content': template.content,
-                'header_text': template.header_text,
-                'footer_text': template.footer_text
-            }
+        # Load templates from database, streamed as dicts without building model instances
+        templates = Template.objects.filter(is_approved=True).values(
+            'name', 'language_code', 'content', 'header_text', 'footer_text'
+        )
+        templates = {template['name']: template for template in templates.iterator(chunk_size=500)}
+        simulator.templates.update(templates)
             
         # Save simulator state
         simulator.save_state()
@@ -4,38 +4,87 @@ import time
 import logging
 import tempfile
 import os
+import itertools
+import threading
 import uuid
-from typing import Dict, Any, List
-import pickle
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
 
+import lz4.frame
+import orjson
+
+from django.conf import settings
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
 
+from core.whatsapp import SendResult
+
 logger = logging.getLogger('simulator.whatsapp')
 
+# Simulated IDs are a random prefix drawn once per process and a counter,
+# unique without reading random bytes for every message
+_ID_PREFIX = uuid.uuid4().hex[:12]
+_id_counter = itertools.count()
+
+
+# Parts of a simulated webhook that never change, shared by every payload
+# and never modified by the webhook handler
+_WEBHOOK_METADATA = {
+    "display_phone_number": "1234567890",
+    "phone_number_id": "1234567890"
+}
+_WEBHOOK_PROFILE = {"name": "Test User"}
+
+
+def _simulated_id(kind: str) -> str:
+    """New unique ID for a simulated message or media, such as sim_in_3f9c0a1b2d4e_42"""
+    return f"{kind}_{_ID_PREFIX}_{next(_id_counter)}"
+
+
+@dataclass(slots=True)
+class LoggedMessage:
+    """A message the simulator has sent"""
+    type: str
+    recipient: str
+    timestamp: float
+    message_id: str
+    content: Optional[str] = None
+    template_name: Optional[str] = None
+    params: Optional[Dict[str, str]] = None
+    # Position in the log, stamped when the message is logged
+    seq: int = -1
+
+
+def _drop_page_cache(fd: int):
+    """Tell the kernel a state file's pages will not be needed again soon"""
+    # posix_fadvise only exists on some platforms (not Windows or macOS)
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+
+
 class WhatsAppSimulator:
     """Simulates WhatsApp Business API for testing"""
-    # Singleton instance
-    _instance = None
 
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(WhatsAppSimulator, cls).__new__(cls)
-            cls._instance.message_log = []
-            cls._instance.media_store = {}
-            cls._instance.conversation_windows = {}
-            cls._instance.templates = {}
-        return cls._instance
-    
     def __init__(self):
-        """Initialize the simulator"""
-        # self.message_log = []
-        # self.media_store = {}
-        # self.conversation_windows = {}
-        # self.templates = {}
-        pass
+        """Initialize the simulator; use get_simulator() for the shared instance"""
+        # Only the most recent messages are kept, so long sessions use bounded memory
+        self.message_log = deque(maxlen=settings.SIMULATOR_LOG_MAX)
+        # The same messages by recipient, oldest first
+        self.messages_by_phone = {}
+        self.media_store = {}
+        self.conversation_windows = {}
+        self.templates = {}
+        # Guards the message log and its per-recipient index across request threads
+        self._lock = threading.Lock()
+        # Increasing sequence numbers for logged messages, used as polling cursors.
+        # They restart with the process and restored messages are numbered afresh,
+        # so cursors are only valid within the epoch they came from.
+        self._seq = itertools.count()
+        self.epoch = _ID_PREFIX
     
-    def send_text(self, recipient_phone: str, text: str) -> Dict[str, Any]:
+    def send_text(self, recipient_phone: str, text: str) -> SendResult:
         """
         Simulate sending a text message
         
@@ -44,28 +93,24 @@ class WhatsAppSimulator:
             text: Message text
             
         Returns:
-            API response
+            SendResult with the simulated message ID
         """
         logger.info("Calling send_text")
-        message_id = f"sim_{uuid.uuid4()}"
+        message_id = _simulated_id("sim")
         
-        self.message_log.append({
-            "type": "text",
-            "recipient": recipient_phone,
-            "content": text,
-            "timestamp": time.time(),
-            "message_id": message_id
-        })
+        self._log_message(LoggedMessage(
+            type="text",
+            recipient=recipient_phone,
+            content=text,
+            timestamp=time.time(),
+            message_id=message_id
+        ))
         
         logger.info(f"[SIMULATOR] Text message sent to {recipient_phone}: {text[:50]}...")
 
-        return {
-            "messaging_product": "whatsapp",
-            "contacts": [{"input": recipient_phone, "wa_id": recipient_phone}],
-            "messages": [{"id": message_id}]
-        }
+        return SendResult(True, message_id)
     
-    def send_audio(self, recipient_phone: str, audio_path: str) -> Dict[str, Any]:
+    def send_audio(self, recipient_phone: str, audio_path: str) -> SendResult:
         """
         Simulate sending an audio message
         
@@ -74,26 +119,22 @@ class WhatsAppSimulator:
             audio_path: Path to audio file
             
         Returns:
-            API response
+            SendResult with the simulated message ID
         """
-        message_id = f"sim_{uuid.uuid4()}"
+        message_id = _simulated_id("sim")
         
-        self.message_log.append({
-            "type": "audio",
-            "recipient": recipient_phone,
-            "content": f"Audio: {audio_path}",
-            "timestamp": time.time(),
-            "message_id": message_id
-        })
+        self._log_message(LoggedMessage(
+            type="audio",
+            recipient=recipient_phone,
+            content=f"Audio: {audio_path}",
+            timestamp=time.time(),
+            message_id=message_id
+        ))
         
         logger.info(f"[SIMULATOR] Audio message sent to {recipient_phone}: {audio_path}")
-        return {
-            "messaging_product": "whatsapp",
-            "contacts": [{"input": recipient_phone, "wa_id": recipient_phone}],
-            "messages": [{"id": message_id}]
-        }
+        return SendResult(True, message_id)
     
-    def send_template(self, recipient_phone: str, template_name: str, template_params: Dict[str, str]) -> Dict[str, Any]:
+    def send_template(self, recipient_phone: str, template_name: str, template_params: Dict[str, str]) -> SendResult:
         """
         Simulate sending a template message
         
@@ -103,25 +144,21 @@ class WhatsAppSimulator:
             template_params: Template parameters
             
         Returns:
-            API response
+            SendResult with the simulated message ID
         """
-        message_id = f"sim_{uuid.uuid4()}"
+        message_id = _simulated_id("sim")
         
-        self.message_log.append({
-            "type": "template",
-            "recipient": recipient_phone,
-            "template_name": template_name,
-            "params": template_params,
-            "timestamp": time.time(),
-            "message_id": message_id
-        })
+        self._log_message(LoggedMessage(
+            type="template",
+            recipient=recipient_phone,
+            template_name=template_name,
+            params=template_params,
+            timestamp=time.time(),
+            message_id=message_id
+        ))
         
         logger.info(f"[SIMULATOR] Template '{template_name}' sent to {recipient_phone}")
-        return {
-            "messaging_product": "whatsapp",
-            "contacts": [{"input": recipient_phone, "wa_id": recipient_phone}],
-            "messages": [{"id": message_id}]
-        }
+        return SendResult(True, message_id)
     
     def simulate_incoming_message(self, phone_number: str, message_content: str, message_type: str = "text") -> Dict[str, Any]:
         """
@@ -136,7 +173,7 @@ class WhatsAppSimulator:
             Webhook data structure
         """
         timestamp = int(time.time())
-        message_id = f"sim_in_{uuid.uuid4()}"
+        message_id = _simulated_id("sim_in")
         
         message = {
             "from": phone_number,
@@ -148,25 +185,21 @@ class WhatsAppSimulator:
         if message_type == "text":
             message["text"] = {"body": message_content}
         elif message_type == "audio":
-            # Save audio to temp file if it's actual audio data
+            # Keep actual audio data in memory for download_media
             if isinstance(message_content, bytes):
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".ogg") as temp_file:
-                    temp_file.write(message_content)
-                    audio_file = temp_file.name
-                    
-                media_id = f"sim_media_{uuid.uuid4()}"
+                media_id = _simulated_id("sim_media")
                 message["audio"] = {"id": media_id}
-                self.media_store[media_id] = audio_file
+                self.media_store[media_id] = message_content
             else:
                 # If it's just test data (a string)
-                media_id = f"sim_media_{uuid.uuid4()}"
+                media_id = _simulated_id("sim_media")
                 message["audio"] = {"id": media_id}
                 
                 # Store the text as media content
                 # In a real scenario, this would be used for speech-to-text testing
                 self.media_store[media_id] = message_content
         
-        # Return webhook-like data structure
+        # Return webhook-like data structure; only the per-message levels are new dicts
         webhook_data = {
             "object": "whatsapp_business_account",
             "entry": [{
@@ -174,18 +207,8 @@ class WhatsAppSimulator:
                 "changes": [{
                     "value": {
                         "messaging_product": "whatsapp",
-                        "metadata": {
-                            "display_phone_number": "1234567890",
-                            "phone_number_id": "1234567890"
-                        },
-                        "contacts": [
-                            {
-                                "profile": {
-                                    "name": "Test User"
-                                },
-                                "wa_id": phone_number
-                            }
-                        ],
+                        "metadata": _WEBHOOK_METADATA,
+                        "contacts": [{"profile": _WEBHOOK_PROFILE, "wa_id": phone_number}],
                         "messages": [message]
                     },
                     "field": "messages"
@@ -242,59 +265,116 @@ class WhatsAppSimulator:
         logger.info(f"[SIMULATOR] Marked message {message_id} as read")
         return {"success": True}
     
-    def get_message_history(self, phone_number: str = None) -> List[Dict[str, Any]]:
+    def _log_message(self, message: LoggedMessage):
+        """
+        Record a sent message in the log and in its recipient's history
+        
+        Args:
+            message: The sent message
+        """
+        with self._lock:
+            # The log is about to drop its oldest message, which is also the oldest of its recipient's
+            if len(self.message_log) == self.message_log.maxlen:
+                oldest = self.message_log[0]
+                phone_log = self.messages_by_phone[oldest.recipient]
+                phone_log.popleft()
+                if not phone_log:
+                    del self.messages_by_phone[oldest.recipient]
+            
+            message.seq = next(self._seq)
+            self.message_log.append(message)
+            self.messages_by_phone.setdefault(message.recipient, deque()).append(message)
+    
+    def get_message_history(self, phone_number: str = None, since: float = 0,
+                            after_seq: Optional[int] = None) -> List[LoggedMessage]:
         """
         Get message history for testing and verification
         
         Args:
             phone_number: Filter by phone number
+            since: Only return messages sent after this timestamp
+            after_seq: Only return messages logged after this sequence number;
+                takes precedence over since
             
         Returns:
-            List of message dictionaries
+            List of sent messages, oldest first
         """
-        if phone_number:
-            return [msg for msg in self.message_log if msg["recipient"] == phone_number]
-        return self.message_log
+        with self._lock:
+            messages = self.messages_by_phone.get(phone_number, ()) if phone_number else self.message_log
+            if after_seq is None and since <= 0:
+                return list(messages)
+            
+            # Messages are in log order, so the newer ones are at the end
+            recent = []
+            for message in reversed(messages):
+                seen = message.seq <= after_seq if after_seq is not None else message.timestamp <= since
+                if seen:
+                    break
+                recent.append(message)
+        recent.reverse()
+        return recent
     
     def reset(self):
         """Reset the simulator state"""
-        self.message_log = []
+        with self._lock:
+            self.message_log.clear()
+            self.messages_by_phone = {}
         self.media_store = {}
         self.conversation_windows = {}
-        
-        # Clean up any temporary files
-        for media_id, content in self.media_store.items():
-            if isinstance(content, str) and os.path.exists(content):
-                try:
-                    os.unlink(content)
-                except:
-                    pass
     
-    def save_state(self, filename='simulator_state.pkl'):
+    def save_state(self, filename='simulator_state.json.lz4'):
         """Save the simulator state to disk"""
+        with self._lock:
+            recent = list(itertools.islice(
+                self.message_log,
+                max(len(self.message_log) - settings.SIMULATOR_STATE_LOG_MAX, 0),
+                None,
+            ))
+        state = {
+            'message_log': recent,
+            'conversation_windows': dict(self.conversation_windows),
+            'templates': dict(self.templates)
+        }
+        temp_path = None
         try:
-            with open(filename, 'wb') as f:
-                pickle.dump({
-                    'message_log': self.message_log,
-                    'conversation_windows': self.conversation_windows,
-                    'templates': self.templates
-                }, f)
+            # Write next to the target and swap it in, so readers never see a partial file
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(filename) or '.', delete=False) as f:
+                temp_path = f.name
+                f.write(lz4.frame.compress(orjson.dumps(state)))
+                f.flush()
+                os.fsync(f.fileno())
+                _drop_page_cache(f.fileno())
+            os.replace(temp_path, filename)
             return True
         except Exception as e:
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
             logger.error(f"Failed to save simulator state: {str(e)}")
             return False
     
-    def load_state(self, filename='simulator_state.pkl'):
+    def load_state(self, filename='simulator_state.json.lz4'):
         """Load the simulator state from disk"""
         try:
             if os.path.exists(filename):
                 with open(filename, 'rb') as f:
-                    state = pickle.load(f)
-                    self.message_log = state.get('message_log', [])
+                    state = orjson.loads(lz4.frame.decompress(f.read()))
+                    _drop_page_cache(f.fileno())
+                    with self._lock:
+                        self.message_log.clear()
+                        self.messages_by_phone = {}
+                        self.epoch = uuid.uuid4().hex[:12]
+                    for message in state.get('message_log', []):
+                        self._log_message(LoggedMessage(**message))
                     self.conversation_windows = state.get('conversation_windows', {})
                     self.templates = state.get('templates', {})
                 return True
             return False
         except Exception as e:
             logger.error(f"Failed to load simulator state: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+
+
+@lru_cache(maxsize=None)
+def get_simulator() -> WhatsAppSimulator:
+    """Shared simulator for the process"""
+    return WhatsAppSimulator()
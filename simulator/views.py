@@ -1,22 +1,38 @@
 # simulator/views.py
 
-import json
+import io
 import logging
-import tempfile
 from typing import Dict, Any
 
+import orjson
+
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.core.files.base import ContentFile
 
-from .simulator import WhatsAppSimulator
+from .simulator import get_simulator
 
 logger = logging.getLogger('simulator.views')
 
 # Create a global simulator instance
-whatsapp_simulator = WhatsAppSimulator()
+whatsapp_simulator = get_simulator()
+
+class ORJsonResponse(HttpResponse):
+    """JSON response encoded with orjson"""
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=orjson.dumps(data), **kwargs)
+
+class MockRequest:
+    """Webhook request carrying an already parsed payload"""
+
+    def __init__(self, data):
+        self.parsed_body = data
+        self.method = "POST"
+        self.body = b""
 
 def index(request):
     """Render the simulator interface"""
@@ -36,7 +52,7 @@ def send_message(request):
     }
     """
     try:
-        data = json.loads(request.body)
+        data = orjson.loads(request.body)
         phone = data.get('phone', '911234567890')
         message = data.get('message', '')
         message_type = data.get('type', 'text')
@@ -49,57 +65,57 @@ def send_message(request):
         # Send to Django webhook handler
         from agent.views import webhook as webhook_handler
         
-        # Create a mock request object
-        class MockRequest:
-            def __init__(self):
-                self.body = json.dumps(webhook_data).encode('utf-8')
-                self.method = "POST"
-        
         # Process through webhook handler
-        response = webhook_handler(MockRequest())
+        response = webhook_handler(MockRequest(webhook_data))
         
-        return JsonResponse({'status': 'processing', 'webhook_status': response.status_code})
+        return ORJsonResponse({'status': 'processing', 'webhook_status': response.status_code})
         
     except Exception as e:
         logger.error(f"Error sending message: {str(e)}")
-        return JsonResponse({'status': 'error', 'message': str(e)})
+        return ORJsonResponse({'status': 'error', 'message': str(e)})
 
 @require_http_methods(["GET"])
 def get_responses(request):
     """
-    Get recent responses from the AI agent
+    Get recent responses from the AI agent, as newline-delimited JSON
     
     Query parameters:
     - phone: Filter by phone number
     - since: Only get messages after this timestamp
+    - after_seq: Only get messages after this sequence number (the last seen 'seq')
+    - epoch: The 'epoch' after_seq came from; a cursor from an earlier process is ignored
     """
     try:
         phone = request.GET.get('phone')
         since = float(request.GET.get('since', 0))
-        
-        # Get message history from simulator
-        messages = whatsapp_simulator.get_message_history(phone)
-        
-        # Filter by timestamp if provided
-        if since > 0:
-            messages = [msg for msg in messages if msg['timestamp'] > since]
-        
-        # Format responses
-        responses = []
-        for msg in messages:
-            responses.append({
-                'type': msg['type'],
-                'content': msg['content'] if msg['type'] == 'text' else '[MEDIA]',
-                'timestamp': msg['timestamp'],
-                'template_name': msg.get('template_name'),
-                'params': msg.get('params')
-            })
-        
-        return JsonResponse(responses, safe=False)
+        after_seq = request.GET.get('after_seq')
+        after_seq = int(after_seq) if after_seq is not None else None
+        epoch = request.GET.get('epoch')
+        if epoch and epoch != whatsapp_simulator.epoch:
+            # Sequence numbers restarted with the server, so send everything
+            after_seq = None
+        
+        # Get message history from simulator, filtered by cursor or timestamp if provided
+        messages = whatsapp_simulator.get_message_history(phone, since, after_seq)
+        
+        # Stream one JSON object per line rather than encoding the whole list at once
+        def format_responses():
+            for msg in messages:
+                yield orjson.dumps({
+                    'type': msg.type,
+                    'content': msg.content if msg.type == 'text' else '[MEDIA]',
+                    'timestamp': msg.timestamp,
+                    'template_name': msg.template_name,
+                    'params': msg.params,
+                    'seq': msg.seq,
+                    'epoch': whatsapp_simulator.epoch
+                }) + b"\n"
+        
+        return StreamingHttpResponse(format_responses(), content_type='application/x-ndjson')
         
     except Exception as e:
         logger.error(f"Error getting responses: {str(e)}")
-        return JsonResponse({'status': 'error', 'message': str(e)})
+        return ORJsonResponse({'status': 'error', 'message': str(e)})
 
 @csrf_exempt
 @require_http_methods(["POST"])
@@ -107,20 +123,16 @@ def upload_audio(request):
     """Handle uploading audio for simulation"""
     try:
         if 'audio' not in request.FILES:
-            return JsonResponse({'status': 'error', 'message': 'No audio file provided'})
+            return ORJsonResponse({'status': 'error', 'message': 'No audio file provided'})
         
         audio_file = request.FILES['audio']
         phone = request.POST.get('phone', '911234567890')
         
-        # Save the audio to a temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.ogg') as temp_file:
-            for chunk in audio_file.chunks():
-                temp_file.write(chunk)
-            audio_path = temp_file.name
-        
-        # Read the audio data
-        with open(audio_path, 'rb') as f:
-            audio_data = f.read()
+        # Read the audio data straight from the upload
+        buffer = io.BytesIO()
+        for chunk in audio_file.chunks():
+            buffer.write(chunk)
+        audio_data = buffer.getvalue()
         
         # Generate webhook data
         webhook_data = whatsapp_simulator.simulate_incoming_message(
@@ -130,20 +142,14 @@ def upload_audio(request):
         # Send to Django webhook handler
         from agent.views import webhook as webhook_handler
         
-        # Create a mock request object
-        class MockRequest:
-            def __init__(self):
-                self.body = json.dumps(webhook_data).encode('utf-8')
-                self.method = "POST"
-        
         # Process through webhook handler
-        response = webhook_handler(MockRequest())
+        response = webhook_handler(MockRequest(webhook_data))
         
-        return JsonResponse({'status': 'processing', 'webhook_status': response.status_code})
+        return ORJsonResponse({'status': 'processing', 'webhook_status': response.status_code})
         
     except Exception as e:
         logger.error(f"Error uploading audio: {str(e)}")
-        return JsonResponse({'status': 'error', 'message': str(e)})
+        return ORJsonResponse({'status': 'error', 'message': str(e)})
 
 @csrf_exempt
 @require_http_methods(["POST"])
@@ -151,7 +157,7 @@ def reset_simulator(request):
     """Reset the simulator state"""
     try:
         whatsapp_simulator.reset()
-        return JsonResponse({'status': 'success', 'message': 'Simulator reset successfully'})
+        return ORJsonResponse({'status': 'success', 'message': 'Simulator reset successfully'})
     except Exception as e:
         logger.error(f"Error resetting simulator: {str(e)}")
-        return JsonResponse({'status': 'error', 'message': str(e)})
\ No newline at end of file
+        return ORJsonResponse({'status': 'error', 'message': str(e)})
\ No newline at end of file
@@ -37,6 +37,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -76,6 +77,20 @@ DATABASES = {
         'PASSWORD': os.environ.get('DB_PASSWORD', ''),
         'HOST': os.environ.get('DB_HOST', ''),
         'PORT': os.environ.get('DB_PORT', ''),
+        # Keep connections open between requests, checking them before reuse
+        'CONN_MAX_AGE': int(os.environ.get('CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+# Cache shared by every worker process on the host (SQLite-backed, LRU-culled)
+CACHES = {
+    'default': {
+        'BACKEND': 'diskcache.DjangoCache',
+        'LOCATION': os.environ.get('CACHE_DIR', str(BASE_DIR / 'cache')),
+        'OPTIONS': {
+            'size_limit': int(os.environ.get('CACHE_SIZE_LIMIT', str(2 ** 30))),  # 1 GB
+        },
     }
 }
 
@@ -104,9 +119,20 @@ USE_TZ = True
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
-STATICFILES_DIRS = [
-    BASE_DIR / 'static',
-]
+# collectstatic writes hashed, compressed copies that WhiteNoise serves with far-future cache headers.
+# Until it has run there is no manifest to look names up in, so plain storage is used instead.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'whitenoise.storage.CompressedManifestStaticFilesStorage'
+            if (STATIC_ROOT / 'staticfiles.json').exists()
+            else 'django.contrib.staticfiles.storage.StaticFilesStorage'
+        ),
+    },
+}
 
 # Media files
 MEDIA_URL = 'media/'
@@ -117,18 +143,30 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Celery Configuration
 CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
-CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'django-db')
+# Results go to Redis, and only for tasks that opt in with ignore_result=False (chord headers)
+CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'redis://localhost:6379/1')
+CELERY_TASK_IGNORE_RESULT = True
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+# Webhook messages and their audio replies get their own queue so bulk campaign work cannot delay replies
+CELERY_TASK_ROUTES = {
+    'agent.tasks.process_inbound_message': {'queue': 'inbound_messages'},
+    'agent.tasks.audio_reply': {'queue': 'inbound_messages'},
+}
 
 # WhatsApp API Settings
 WHATSAPP_API_KEY = os.environ.get('WHATSAPP_API_KEY', '')
 WHATSAPP_PHONE_NUMBER_ID = os.environ.get('WHATSAPP_PHONE_NUMBER_ID', '')
 WHATSAPP_BUSINESS_ACCOUNT_ID = os.environ.get('WHATSAPP_BUSINESS_ACCOUNT_ID', '')
 WHATSAPP_API_VERSION = os.environ.get('WHATSAPP_API_VERSION', 'v17.0')
+# Outgoing messages per second and concurrent sends for bulk tasks such as campaigns
+WHATSAPP_SEND_RATE = int(os.environ.get('WHATSAPP_SEND_RATE', '50'))
+WHATSAPP_SEND_WORKERS = int(os.environ.get('WHATSAPP_SEND_WORKERS', '10'))
+# Redis holding the send budget shared by all Celery workers
+RATE_LIMIT_REDIS_URL = os.environ.get('RATE_LIMIT_REDIS_URL', CELERY_BROKER_URL)
 
 # Add to whatsapp_loan_agent/settings.py
 USE_WHATSAPP_SIMULATOR = os.environ.get('USE_WHATSAPP_SIMULATOR', 'True').lower() in ('true', '1', 'yes')
@@ -140,11 +178,46 @@ if USE_WHATSAPP_SIMULATOR:
     WHATSAPP_BUSINESS_ACCOUNT_ID = 'simulator_account_id'
     WHATSAPP_VERIFY_TOKEN = 'simulator_verify_token'
 
+# Most sent messages the simulator keeps for its UI
+SIMULATOR_LOG_MAX = int(os.environ.get('SIMULATOR_LOG_MAX', '10000'))
+# Most recent messages written out by save_state
+SIMULATOR_STATE_LOG_MAX = int(os.environ.get('SIMULATOR_STATE_LOG_MAX', '1000'))
+
 # AI Model Settings
 OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY', '')
 DEFAULT_AI_MODEL = os.environ.get('DEFAULT_AI_MODEL', 'gpt-4o')
+# Intent detection and information extraction use a smaller, faster model than replies
+INTENT_AI_MODEL = os.environ.get('INTENT_AI_MODEL', 'gpt-4o-mini')
+EXTRACT_AI_MODEL = os.environ.get('EXTRACT_AI_MODEL', 'gpt-4o-mini')
+GENERATION_AI_MODEL = os.environ.get('GENERATION_AI_MODEL', DEFAULT_AI_MODEL)
+# Chat completions per minute across all workers, and in flight per process
+OPENAI_REQUESTS_PER_MINUTE = int(os.environ.get('OPENAI_REQUESTS_PER_MINUTE', '3000'))
+OPENAI_MAX_CONCURRENT_REQUESTS = int(os.environ.get('OPENAI_MAX_CONCURRENT_REQUESTS', '50'))
+# Extraction prompts arriving within this many ms are sent as one request (0 disables batching).
+# Batches only form between threads of one process: leave it at 0 for Celery prefork workers,
+# where each process handles one message at a time and the window only adds latency.
+OPENAI_BATCH_WINDOW_MS = int(os.environ.get('OPENAI_BATCH_WINDOW_MS', '0'))
+OPENAI_BATCH_SIZE = int(os.environ.get('OPENAI_BATCH_SIZE', '8'))
+# Directory of a local ONNX intent classifier tried before the chat model (optional, needs requirements-ml.txt)
+INTENT_CLASSIFIER_DIR = os.environ.get('INTENT_CLASSIFIER_DIR', '')
+# Intent centroids from `manage.py build_intent_centroids`, used when there is no ONNX classifier (optional)
+INTENT_CENTROIDS_FILE = os.environ.get('INTENT_CENTROIDS_FILE', '')
+INTENT_EMBEDDING_MODEL = os.environ.get('INTENT_EMBEDDING_MODEL', 'text-embedding-3-small')
+# fastText language identification model (lid.176.bin or lid.176.ftz) used instead of the chat model
+# (optional, needs requirements-ml.txt)
+LANGUAGE_ID_MODEL = os.environ.get('LANGUAGE_ID_MODEL', '')
+# Generated speech is cached here by text, and files unused for TTS_CACHE_DAYS are cleaned up
+TTS_CACHE_DIR = os.environ.get('TTS_CACHE_DIR', MEDIA_ROOT / 'tts_cache')
+TTS_CACHE_DAYS = int(os.environ.get('TTS_CACHE_DAYS', '30'))
 
 # Logging Configuration
+# Log file written by the background queue listener
+LOG_FILE = BASE_DIR / 'logs' / 'agent.log'
+LOG_FILE_MAX_BYTES = 1024 * 1024 * 5  # 5 MB
+LOG_FILE_BACKUP_COUNT = 5  # gzipped on rotation
+# Records beyond this many pending writes are dropped rather than blocking
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -158,8 +231,7 @@ LOGGING = {
             'style': '{',
         },
         'json': {
-            'format': '{"time": "%(asctime)s", "level": "%(levelname)s", "module": "%(module)s", "message": "%(message)s"}',
-            'style': '%',
+            '()': 'core.log_queue.OrjsonFormatter',
         },
     },
     'handlers': {
@@ -168,13 +240,10 @@ LOGGING = {
             'class': 'logging.StreamHandler',
             'formatter': 'verbose',
         },
-        'file': {
+        # Only enqueues; the file is written by the listener started in AgentConfig.ready()
+        'queue': {
             'level': 'INFO',
-            'class': 'logging.handlers.RotatingFileHandler',
-            'filename': BASE_DIR / 'logs' / 'agent.log',
-            'maxBytes': 1024 * 1024 * 5,  # 5 MB
-            'backupCount': 5,
-            'formatter': 'json',
+            'class': 'core.log_queue.DroppingQueueHandler',
         },
     },
     'loggers': {
@@ -184,12 +253,12 @@ LOGGING = {
             'propagate': True,
         },
         'agent': {
-            'handlers': ['console', 'file'],
+            'handlers': ['console', 'queue'],
             'level': 'INFO',
             'propagate': False,
         },
         'core': {
-            'handlers': ['console', 'file'],
+            'handlers': ['console', 'queue'],
             'level': 'INFO',
             'propagate': False,
         },